@@ -148,20 +148,24 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     logging.getLogger().setLevel(config.log_level)
     logger.setLevel(config.log_level)
 
-    # Start health check server in a separate thread
-    from .health import create_health_app
-    from .server import run_health_server
-
-    health_app = create_health_app()
-    logger.info(f"Starting health server on {config.listen_address}:{config.health_port}")
-    health_thread = threading.Thread(
-        target=run_health_server,
-        args=(health_app, config),
-        daemon=True,
-        name="HealthServerThread",
-    )
-    health_thread.start()
-    logger.info("Health server thread started")
+    # Start health check server in a separate thread, unless run_servers is
+    # already serving the health app alongside this one
+    if getattr(app.state, "health_served_by_run_servers", False):
+        logger.info("Health server is run by run_servers; not starting health thread")
+    else:
+        from .health import create_health_app
+        from .server import run_health_server
+
+        health_app = create_health_app()
+        logger.info(f"Starting health server on {config.listen_address}:{config.health_port}")
+        health_thread = threading.Thread(
+            target=run_health_server,
+            args=(health_app, config),
+            daemon=True,
+            name="HealthServerThread",
+        )
+        health_thread.start()
+        logger.info("Health server thread started")
 
     state = AppState(config)
     app.state.app_state = state
@@ -1,11 +1,10 @@
 """Server setup and run_servers coroutine for ExternalDNS Technitium Webhook."""
 
 import asyncio
-import contextlib
 import logging
 import signal
 import sys
-import threading
+from collections.abc import Callable
 
 from fastapi import FastAPI
 
@@ -19,9 +18,34 @@ from .config import Config as AppConfig
 UvicornConfig = None
 Server = None
 
+# Seconds run_servers waits for the health server to bind before starting the
+# main server anyway.
+HEALTH_STARTUP_TIMEOUT = 5.0
+
+# Seconds run_servers waits for the health server to stop once the main server
+# has exited, so a hung health server cannot block process exit.
+HEALTH_SHUTDOWN_TIMEOUT = 5.0
+
+
+def _event_loop_factory() -> Callable[[], asyncio.AbstractEventLoop] | None:
+    """Return uvloop's loop constructor when installed, else None for the stock loop.
+
+    uvloop ships with ``uvicorn[standard]``, but uvicorn only selects it when it
+    creates the loop itself; ``Server.serve()`` runs on whatever loop we give it.
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
+
 
 def run_health_server(health_app: FastAPI, config: AppConfig) -> None:
-    """Run the health check server in the current thread (for threading).
+    """Run the health check server to completion on its own event loop.
+
+    ``main.lifespan`` runs this in a thread when the webhook is started with
+    ``uvicorn main:app`` (the container entrypoint). Under ``run_servers`` the
+    health app is served on the main loop instead and the thread is skipped.
 
     Args:
         health_app: FastAPI health check application
@@ -59,15 +83,12 @@ def run_health_server(health_app: FastAPI, config: AppConfig) -> None:
         real_server_cls = Server if Server is not None else UvicornServer
         health_server = real_server_cls(health_config)
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        logging.info("[HEALTH] Health server event loop created")
-        sys.stderr.write("[HEALTH] Health server event loop created\n")
+        logging.info("[HEALTH] Health server event loop starting")
+        sys.stderr.write("[HEALTH] Health server event loop starting\n")
         sys.stderr.flush()
 
         try:
-            loop.run_until_complete(health_server.serve())
+            asyncio.run(health_server.serve(), loop_factory=_event_loop_factory())
         except (KeyboardInterrupt, SystemExit) as e:
             # Log shutdown signals at INFO level without stack trace, then
             # re-raise so that callers (the thread or test harness) can act on
@@ -82,9 +103,6 @@ def run_health_server(health_app: FastAPI, config: AppConfig) -> None:
             logging.error(f"[HEALTH] Health server serve error: {e}", exc_info=True)
             sys.stderr.write(f"[HEALTH] Error: {e}\n")
             sys.stderr.flush()
-        finally:
-            loop.close()
-            logging.info("[HEALTH] Health server loop closed")
     except Exception as e:
         logging.error(f"[HEALTH] Health server error: {e}", exc_info=True)
         sys.stderr.write(f"[HEALTH] Fatal error: {e}\n")
@@ -92,7 +110,16 @@ def run_health_server(health_app: FastAPI, config: AppConfig) -> None:
 
 
 def run_servers(app: FastAPI, health_app: FastAPI, config: AppConfig) -> None:
+    """Run the main and health servers concurrently on one event loop.
+
+    Args:
+        app: Main webhook FastAPI application
+        health_app: FastAPI health check application
+        config: Application configuration
+    """
     logging.info("run_servers() called")
+    # Tell main.lifespan not to start its own health server thread on health_port
+    app.state.health_served_by_run_servers = True
     # Lazy-import uvicorn symbols here as well to avoid importing
     # the websockets backend during module import.
     from uvicorn import Config as UvicornConfig
@@ -119,11 +146,9 @@ def run_servers(app: FastAPI, health_app: FastAPI, config: AppConfig) -> None:
         ws="websockets-sansio",  # Use sans-I/O implementation, avoid deprecated websockets.legacy
     )
     health_server = real_server_cls(health_config)
-    shutdown_event = threading.Event()
 
     def handle_signal(signum: int, _frame: object) -> None:
         logging.info(f"Received signal {signum}, shutting down...")
-        shutdown_event.set()
         main_server.should_exit = True
         health_server.should_exit = True
 
@@ -133,87 +158,44 @@ def run_servers(app: FastAPI, health_app: FastAPI, config: AppConfig) -> None:
     logging.info(f"Starting main server on {config.listen_address}:{config.listen_port}")
     logging.info(f"Starting health server on {config.listen_address}:{config.health_port}")
 
-    health_server_ready = threading.Event()
-    # Use BaseException type because we may capture SystemExit from uvicorn
-    health_server_error: BaseException | None = None
-
-    def run_health_server_inline() -> None:
-        """Run health server in a thread. This is tested through integration tests."""
-        nonlocal health_server_error
-        sys.stderr.write("[HEALTH-THREAD-START] Health server thread function called\n")
-        sys.stderr.flush()
+    async def serve_health() -> None:
+        # A failing health server (including uvicorn's sys.exit on a bind error)
+        # is logged and must not take the main server down with it.
         try:
-            # Direct stderr write to ensure visibility
-            sys.stderr.write("[HEALTH] Health server thread started\n")
-            sys.stderr.flush()
-
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            async def serve_and_signal() -> None:
-                logging.info("Health server starting...")
-                sys.stderr.write("[HEALTH] Health server async function started\n")
-                sys.stderr.flush()
-
-                # Start the server but don't wait for it immediately
-                server_task = asyncio.create_task(health_server.serve())
-                sys.stderr.write("[HEALTH] Health server task created\n")
-                sys.stderr.flush()
-
-                # Give uvicorn a brief moment to bind to the port and start accepting connections
-                with contextlib.suppress(TimeoutError):
-                    await asyncio.wait_for(asyncio.sleep(0.5), timeout=1.0)
-
-                # Signal that the server is ready (after binding attempt)
-                health_server_ready.set()
-                logging.info(
-                    f"Health server listening on {config.listen_address}:{config.health_port}"
-                )
-                sys.stderr.write(
-                    f"[HEALTH] Server ready on {config.listen_address}:{config.health_port}\n"
-                )
-                sys.stderr.flush()
-
-                # Now wait for the server indefinitely (until it exits)
-                try:
-                    await server_task
-                except Exception as serve_error:
-                    logging.error(f"Health server serve error: {serve_error}", exc_info=True)
+            await health_server.serve()
+        except (Exception, SystemExit) as e:
+            logging.error(f"Health server serve error: {e}", exc_info=True)
+
+    async def serve_both() -> None:
+        """Run both servers concurrently on a single event loop."""
+        health_task = asyncio.create_task(serve_health())
+
+        # uvicorn flips Server.started once its sockets are bound; poll it rather
+        # than signalling readiness separately.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + HEALTH_STARTUP_TIMEOUT
+        while not health_server.started and not health_task.done() and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        if health_server.started:
+            logging.info("Health server is ready")
+        elif not health_task.done():
+            logging.error(
+                "Health server failed to start (timeout waiting for server to bind to port)"
+            )
 
-            loop.run_until_complete(serve_and_signal())
-        except Exception as e:
-            # Catch general exceptions in health server thread to prevent propagation
-            # to main thread. SystemExit and KeyboardInterrupt are handled at the
-            # main thread level.
-            health_server_error = e
-            sys.stderr.write(f"[HEALTH] Error: {e}\n")
-            sys.stderr.flush()
-            logging.error(f"Health server error: {e}", exc_info=True)
+        try:
+            await main_server.serve()
         finally:
-            health_server_ready.set()  # Signal even on error to unblock main thread
-            sys.stderr.write("[HEALTH] Health server thread ending\n")
-            sys.stderr.flush()
-            with contextlib.suppress(Exception):
-                loop.close()
-
-    health_thread = threading.Thread(target=run_health_server_inline, daemon=True)
-    logging.info("Creating health server thread...")
-    logging.info(f"Health thread daemon: {health_thread.daemon}")
-    health_thread.start()
-    logging.info("Health server thread started")
-
-    # Wait for health server to be ready, with timeout
-    if not health_server_ready.wait(timeout=10):
-        logging.error("Health server failed to start (timeout waiting for server to bind to port)")
-    elif health_server_error:
-        logging.error(f"Health server encountered error during startup: {health_server_error}")
-    else:
-        logging.info("Health server is ready")
+            main_server.should_exit = True
+            health_server.should_exit = True
+            try:
+                await asyncio.wait_for(health_task, HEALTH_SHUTDOWN_TIMEOUT)
+            except TimeoutError:
+                logging.error(
+                    f"Health server did not stop within {HEALTH_SHUTDOWN_TIMEOUT}s; cancelled it"
+                )
 
     try:
-        asyncio.run(main_server.serve())
+        asyncio.run(serve_both(), loop_factory=_event_loop_factory())
     except Exception as e:
         logging.error(f"Main server error: {e}")
-    finally:
-        shutdown_event.set()
-        health_thread.join(timeout=5)
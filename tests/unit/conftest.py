@@ -26,7 +26,7 @@ def _disable_asyncio_run(monkeypatch):
         # If the module exposes asyncio, patch its run function. Use a lambda
         # that returns None to mimic the behavior of a completed call.
         if hasattr(main_mod, "asyncio"):
-            monkeypatch.setattr(main_mod.asyncio, "run", lambda coro: None)
+            monkeypatch.setattr(main_mod.asyncio, "run", lambda coro, **kwargs: None)
     except Exception:
         # If import fails for some reason, don't block tests; they will fail
         # normally and provide more context.
@@ -2,6 +2,10 @@
 
 from datetime import UTC, datetime
 
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+
+from external_dns_technitium_webhook import __version__
 from external_dns_technitium_webhook.health import (
     create_health_app,
     is_main_server_ready,
@@ -230,3 +234,19 @@ def test_is_main_server_ready_exception(mocker):
 
     assert result is False
     mock_logger.assert_called_once()
+
+
+def test_create_health_app_metadata():
+    """The health app carries its own metadata, exposes /health and has no docs routes."""
+    app = create_health_app()
+
+    assert isinstance(app, FastAPI)
+    assert app.title == "ExternalDNS Technitium Webhook - Health"
+    assert app.description == "Health check endpoint for ExternalDNS Technitium webhook"
+    assert app.version == __version__
+    assert app.docs_url is None
+    assert app.redoc_url is None
+    assert app.openapi_url is None
+
+    routes = [route.path for route in app.routes if isinstance(route, APIRoute)]
+    assert "/health" in routes
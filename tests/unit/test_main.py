@@ -2,32 +2,24 @@
 
 import asyncio
 import logging
-import os
-from collections.abc import Callable
+import re
+from collections import defaultdict
+from collections.abc import Awaitable, Callable, Iterator
 from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
 from types import SimpleNamespace
-from typing import cast
-from unittest.mock import ANY, AsyncMock, MagicMock
+from typing import Any, NamedTuple, cast
+from unittest.mock import ANY, AsyncMock, MagicMock, call, patch
 
+import httpx
 import pytest
 from fastapi import FastAPI, Request, Response
 from fastapi.testclient import TestClient
 from pytest_mock import MockerFixture
 
+from external_dns_technitium_webhook import handlers, main
 from external_dns_technitium_webhook.app_state import AppState
 from external_dns_technitium_webhook.config import Config
-from external_dns_technitium_webhook.handlers import (
-    adjust_endpoints as real_adjust_endpoints,
-)
-from external_dns_technitium_webhook.handlers import (
-    apply_record as real_apply_record,
-)
-from external_dns_technitium_webhook.handlers import (
-    get_records as real_get_records,
-)
-from external_dns_technitium_webhook.handlers import (
-    negotiate_domain_filter as real_negotiate_domain_filter,
-)
 from external_dns_technitium_webhook.main import (
     StructuredFormatter,
     ZonePreparationResult,
@@ -62,777 +54,562 @@ from external_dns_technitium_webhook.technitium_client import (
 # --- test helpers -----------------------------------------------------------
 
 
-@pytest.fixture(autouse=True)
-def _stub_health_thread(mocker: MockerFixture) -> None:
-    """Prevent the background health server from actually starting.
-
-    Many of the unit tests create a ``TestClient(app)`` which triggers the
-    FastAPI lifespan manager; that code spins up a thread running
-    ``run_health_server`` from the ``server`` module.  Rather than allowing
-    the thread to bind a real port (which provokes a warning/error if the
-    port is already in use), we stub the function to a benign lambda.
-    """
-    # patch the actual implementation used by the lifespan context
-    mocker.patch(
-        "external_dns_technitium_webhook.server.run_health_server", lambda *args, **kwargs: None
-    )
-
-
-def test_app_creation(mocker: MockerFixture) -> None:
-    """Test application creation with mocked dependencies."""
-    # Mock config to avoid actual environment variables
-    mocker.patch(
-        "external_dns_technitium_webhook.main.AppConfig",
-        return_value=Config(
-            technitium_url="http://localhost:5380",
-            technitium_username="admin",
-            technitium_password="password",
-            zone="example.com",
-            domain_filters="example.com",
-        ),
-    )
-
-    app = create_app()
-
-    assert isinstance(app, FastAPI)
-    assert hasattr(app, "router")
-    # app_state is set during lifespan, not during create_app()
-
-
-def test_app_has_middleware(mocker: MockerFixture) -> None:
-    """Test middleware is properly configured."""
-    mocker.patch(
-        "external_dns_technitium_webhook.main.AppConfig",
-        return_value=Config(
-            technitium_url="http://localhost:5380",
-            technitium_username="admin",
-            technitium_password="password",
-            zone="example.com",
-            domain_filters="example.com",
-        ),
-    )
-
-    app = create_app()
+_CONFIG_VALUES: dict[str, object] = {
+    "technitium_url": "http://localhost:5380",
+    "technitium_username": "admin",
+    "technitium_password": "password",
+    "zone": "example.com",
+    "domain_filters": "example.com",
+}
+_CONFIG = Config(**_CONFIG_VALUES)
 
-    # Check that middleware was added
-    assert len(app.user_middleware) > 0
 
+def _build_config(**overrides: object) -> Config:
+    """Helper to create a minimal configuration for tests.
 
-def test_app_cors_enabled(mocker: MockerFixture) -> None:
-    """Test CORS middleware is enabled."""
-    mocker.patch(
-        "external_dns_technitium_webhook.main.AppConfig",
-        return_value=Config(
-            technitium_url="http://localhost:5380",
-            technitium_username="admin",
-            technitium_password="password",
-            zone="example.com",
-            domain_filters="example.com",
-        ),
-    )
-
-    app = create_app()
-
-    # Check for CORS middleware
-    middleware_names = [str(m) for m in app.user_middleware]
-    assert any("CORS" in name for name in middleware_names)
-
+    Without overrides the module-level instance is returned, so validation runs
+    once; Config is mutable, so tests must not modify the result.
+    """
 
-@pytest.mark.asyncio
-async def test_ensure_zone_ready_existing_zone(mocker: MockerFixture) -> None:
-    """Ensure existing zone returns writable status without creation."""
+    if not overrides:
+        return _CONFIG
+    return Config(**{**_CONFIG_VALUES, **overrides})
 
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
 
-    options = GetZoneOptionsResponse(
-        name=config.zone,
+_CATALOG_CONFIG = _build_config(catalog_zone="catalog.example.com")
+_FAILOVER_CONFIG = _build_config(
+    technitium_url="http://primary:5380", technitium_failover_urls="http://failover:5380"
+)
+_NO_ENDPOINT_CONFIG = _build_config(technitium_url=" ")  # trimmed to empty
+
+
+def _zone_options(
+    catalog_zone_name: str | None = None,
+    available: list[str] | None = None,
+    *,
+    read_only: bool = False,
+) -> GetZoneOptionsResponse:
+    """Zone options for example.com with the given catalog state."""
+    return GetZoneOptionsResponse.model_construct(
+        name="example.com",
         isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName=None,
-        availableCatalogZoneNames=[],
+        isReadOnly=read_only,
+        catalogZoneName=catalog_zone_name,
+        availableCatalogZoneNames=available or [],
     )
 
-    mocker.patch.object(state.client, "get_zone_options", return_value=options)
-
-    result = await ensure_zone_ready(state)
-
-    assert result.zone_created is False
-    assert result.is_writable is True
-    assert result.server_role == "primary"
-    assert result.catalog_membership is None
 
+# Shared response models; tests read them but must not mutate them (use model_copy).
+_OPTIONS_WRITABLE = _zone_options()
+_OPTIONS_READONLY = _zone_options("catalog.example.com", ["catalog.example.com"], read_only=True)
+_OPTIONS_WITH_CATALOG_AVAILABLE = _zone_options(None, ["catalog.example.com"])
+_OPTIONS_CATALOG_MISSING = _zone_options(None, ["other.example.com"])
+_OPTIONS_ENROLLED = _zone_options("catalog.example.com", ["catalog.example.com"])
+_OPTIONS_CURRENT_CATALOG_AVAILABLE = _zone_options("current.example.com", ["catalog.example.com"])
+_OPTIONS_CURRENT_CATALOG_MISSING = _zone_options("current.example.com", ["other.example.com"])
+_LOGIN_OK = LoginResponse(username="admin", displayName="Admin", token="test-token")
+_ZONE_CREATED = CreateZoneResponse(domain="example.com")
 
-@pytest.mark.asyncio
-async def test_ensure_zone_ready_creates_zone_when_missing(mocker: MockerFixture) -> None:
-    """Ensure zone is created when missing."""
 
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
+class FakeTechnitiumClient:
+    """Cheap async stand-in for the TechnitiumClient methods these tests exercise.
 
-    options_after_create = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName=None,
-        availableCatalogZoneNames=[],
-    )
+    Queue results per method name in ``responses``; a queued exception is raised
+    instead of returned and the last queued result repeats once the rest are
+    used up. Every call is recorded in ``calls`` as a ``unittest.mock.call``.
+    """
 
-    mocker.patch.object(
-        state.client,
-        "get_zone_options",
-        side_effect=[TechnitiumError("zone not found"), options_after_create],
-    )
+    def __init__(self, *, base_url: str, **_kwargs: object) -> None:
+        self.base_url = base_url
+        self.token: str | None = None
+        self.calls: defaultdict[str, list[Any]] = defaultdict(list)
+        self.responses: defaultdict[str, list[object]] = defaultdict(list)
 
-    mock_create = mocker.patch.object(
-        state.client,
-        "create_zone",
-        new_callable=AsyncMock,
-        return_value=CreateZoneResponse(domain=config.zone),
-    )
+    async def _respond(self, method: str, *args: object, **kwargs: object) -> Any:
+        self.calls[method].append(call(*args, **kwargs))
+        queued = self.responses[method]
+        result = (queued.pop(0) if len(queued) > 1 else queued[0]) if queued else None
+        if isinstance(result, BaseException):
+            raise result
+        return result
 
-    result = await ensure_zone_ready(state)
+    async def login(self, **kwargs: object) -> Any:
+        return await self._respond("login", **kwargs)
 
-    assert result.zone_created is True
-    assert result.is_writable is True
-    mock_create.assert_awaited_once()
+    async def get_zone_options(self, *args: object, **kwargs: object) -> Any:
+        return await self._respond("get_zone_options", *args, **kwargs)
 
+    async def create_zone(self, *args: object, **kwargs: object) -> Any:
+        return await self._respond("create_zone", *args, **kwargs)
 
-@pytest.mark.asyncio
-async def test_ensure_zone_ready_secondary_skips_catalog(mocker: MockerFixture) -> None:
-    """Read-only endpoints should not attempt catalog enrollment."""
-
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-        catalog_zone="catalog.example.com",
-    )
-    state = AppState(config=config)
+    async def enroll_catalog(self, **kwargs: object) -> Any:
+        return await self._respond("enroll_catalog", **kwargs)
 
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=True,
-        catalogZoneName="catalog.example.com",
-        availableCatalogZoneNames=["catalog.example.com"],
-    )
+    async def set_zone_options(self, *args: object, **kwargs: object) -> Any:
+        return await self._respond("set_zone_options", *args, **kwargs)
 
-    mocker.patch.object(state.client, "get_zone_options", return_value=options)
-    catalog_mock = mocker.patch(
-        "external_dns_technitium_webhook.main.ensure_catalog_membership",
-        new_callable=AsyncMock,
-    )
+    async def close(self) -> None:
+        self.calls["close"].append(call())
 
-    try:
-        result = await ensure_zone_ready(state)
-    finally:
-        await state.close()
 
-    assert result.is_writable is False
-    assert result.server_role == "secondary"
-    assert result.catalog_membership == "catalog.example.com"
-    catalog_mock.assert_not_called()
+@pytest.fixture(scope="module", autouse=True)
+def _patch_client() -> Iterator[None]:
+    """Build every AppState in this module around a FakeTechnitiumClient.
 
+    The real client creates an httpx connection pool on construction; none of
+    these tests talk to a server.
+    """
+    with patch("external_dns_technitium_webhook.app_state.TechnitiumClient", FakeTechnitiumClient):
+        yield
 
-@pytest.mark.asyncio
-async def test_ensure_zone_ready_invokes_catalog_membership(mocker: MockerFixture) -> None:
-    """Primary endpoints with catalog configured should enroll membership."""
 
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-        catalog_zone="catalog.example.com",
-    )
-    state = AppState(config=config)
+@pytest.fixture(scope="module", autouse=True)
+def _no_openapi() -> Iterator[None]:
+    """Build every app in this module without the OpenAPI schema and docs routes.
 
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName=None,
-        availableCatalogZoneNames=["catalog.example.com"],
-    )
+    No test here reads the schema, so create_app() skips generating it.
+    """
 
-    mocker.patch.object(
-        state.client, "get_zone_options", new_callable=AsyncMock, return_value=options
-    )
-    catalog_mock = mocker.patch(
-        "external_dns_technitium_webhook.main.ensure_catalog_membership",
-        new_callable=AsyncMock,
-        return_value="catalog.example.com",
-    )
+    def _fastapi(**kwargs: Any) -> FastAPI:
+        return FastAPI(**{**kwargs, "openapi_url": None, "docs_url": None, "redoc_url": None})
 
-    try:
-        result = await ensure_zone_ready(state)
-    finally:
-        await state.close()
+    with patch.object(main, "FastAPI", _fastapi):
+        yield
 
-    assert result.catalog_membership == "catalog.example.com"
-    catalog_mock.assert_awaited_once_with(state, options, "catalog.example.com")
 
+@pytest.fixture(scope="module", autouse=True)
+def _patch_app_config() -> Iterator[None]:
+    """Have every create_app()/main() call in this module load ``_build_config()``."""
+    with patch.object(main, "AppConfig", return_value=_build_config()):
+        yield
 
-@pytest.mark.asyncio
-async def test_create_default_zone(mocker: MockerFixture) -> None:
-    """Test creating default zone."""
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-        catalog_zone="catalog.example.com",
-    )
-    state = AppState(config=config)
 
-    # Mock create_zone
-    mock_response = CreateZoneResponse(domain="example.com")
+@pytest.fixture
+def state(request: pytest.FixtureRequest) -> AppState:
+    """AppState for ``_build_config()``; parametrize indirectly for another Config."""
+    return AppState(config=getattr(request, "param", _build_config()))
 
-    mock_create = mocker.patch.object(
-        state.client,
-        "create_zone",
-        new_callable=AsyncMock,
-        return_value=mock_response,
-    )
 
-    # Should not raise any exception
-    await create_default_zone(state)
-    mock_create.assert_awaited_once_with(
-        zone=config.zone,
-        zone_type="Primary",
-        protocol="Udp",
-        dnssec_validation=True,
-        catalog=config.catalog_zone_name,
-    )
+@pytest.fixture
+def fake_client(state: AppState) -> FakeTechnitiumClient:
+    """The FakeTechnitiumClient behind ``state``."""
+    return cast(FakeTechnitiumClient, state.client)
 
 
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_skips_when_unavailable(
-    mocker: MockerFixture,
-) -> None:
-    """Do not enroll when desired catalog is not offered by endpoint."""
+@pytest.fixture(autouse=True)
+def _stub_health_thread(mocker: MockerFixture) -> None:
+    """Prevent the background health server from actually starting.
 
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
+    Many of the unit tests create a ``TestClient(app)`` which triggers the
+    FastAPI lifespan manager; that code spins up a thread running
+    ``run_health_server`` from the ``server`` module.  Rather than allowing
+    the thread to bind a real port (which provokes a warning/error if the
+    port is already in use), we stub the function to a benign lambda.
+    """
+    # patch the actual implementation used by the lifespan context
+    mocker.patch(
+        "external_dns_technitium_webhook.server.run_health_server", lambda *args, **kwargs: None
     )
-    state = AppState(config=config)
 
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName=None,
-        availableCatalogZoneNames=["other.example.com"],
-    )
 
-    set_mock = mocker.patch.object(state.client, "set_zone_options", new_callable=AsyncMock)
+@asynccontextmanager
+async def _dummy_lifespan(_app: FastAPI):
+    """Lifespan that skips Technitium setup and the health server thread."""
+    yield
 
-    try:
-        result = await ensure_catalog_membership(state, options, "catalog.example.com")
-    finally:
-        await state.close()
 
-    assert result is None
-    set_mock.assert_not_called()
+@pytest.fixture(scope="module")
+def built_app() -> FastAPI:
+    """One create_app() result shared by the app-construction and routing tests."""
+    # Only swap the lifespan while building, so lifespan tests still see the real one
+    with patch("external_dns_technitium_webhook.main.lifespan", _dummy_lifespan):
+        return create_app()
 
 
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_returns_existing_membership(
-    mocker: MockerFixture,
-) -> None:
-    """When already enrolled, ensure_catalog_membership should return current membership."""
+def test_app_creation(built_app: FastAPI) -> None:
+    """Test application creation with mocked dependencies."""
+    assert isinstance(built_app, FastAPI)
+    assert hasattr(built_app, "router")
+    # app_state is set during lifespan, not during create_app()
 
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
 
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName="catalog.example.com",
-        availableCatalogZoneNames=["catalog.example.com"],
-    )
+def test_app_has_middleware(built_app: FastAPI) -> None:
+    """Test middleware is properly configured."""
+    assert len(built_app.user_middleware) > 0
 
-    try:
-        membership = await ensure_catalog_membership(state, options, "catalog.example.com")
-    finally:
-        await state.close()
 
-    assert membership == "catalog.example.com"
+def test_app_cors_enabled(built_app: FastAPI) -> None:
+    """Test CORS middleware is enabled."""
+    middleware_names = [str(m) for m in built_app.user_middleware]
+    assert any("CORS" in name for name in middleware_names)
 
 
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_enrolls_when_available(
+@pytest.mark.parametrize(
+    ("state", "side_effects", "catalog_result", "expected"),
+    [
+        (
+            _build_config(),
+            [_OPTIONS_WRITABLE],
+            None,
+            ZonePreparationResult(False, True, "primary", None),
+        ),
+        (
+            _build_config(),
+            [TechnitiumError("zone not found"), _OPTIONS_WRITABLE],
+            None,
+            ZonePreparationResult(True, True, "primary", None),
+        ),
+        (
+            _CATALOG_CONFIG,
+            [_OPTIONS_READONLY],
+            None,
+            ZonePreparationResult(False, False, "secondary", "catalog.example.com"),
+        ),
+        (
+            _CATALOG_CONFIG,
+            [_OPTIONS_WITH_CATALOG_AVAILABLE],
+            "catalog.example.com",
+            ZonePreparationResult(False, True, "primary", "catalog.example.com"),
+        ),
+    ],
+    ids=[
+        "existing-zone",
+        "creates-zone-when-missing",
+        "secondary-skips-catalog",
+        "invokes-catalog-membership",
+    ],
+    indirect=["state"],
+)
+async def test_ensure_zone_ready(
+    state: AppState,
+    fake_client: FakeTechnitiumClient,
+    side_effects: list[object],
+    catalog_result: str | None,
+    expected: ZonePreparationResult,
     mocker: MockerFixture,
 ) -> None:
-    """Enroll zone when catalog is offered and server reports membership."""
-
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName=None,
-        availableCatalogZoneNames=["Catalog.Example.com"],
-    )
-
-    enroll_mock = mocker.patch.object(state.client, "enroll_catalog", new_callable=AsyncMock)
-    refreshed = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=True,
-        isReadOnly=False,
-        catalogZoneName="catalog.example.com",
-        availableCatalogZoneNames=["catalog.example.com"],
-    )
-    mocker.patch.object(
-        state.client,
-        "get_zone_options",
-        new_callable=AsyncMock,
-        return_value=refreshed,
-    )
-
-    try:
-        membership = await ensure_catalog_membership(state, options, "catalog.example.com")
-    finally:
-        await state.close()
-
-    assert membership == "catalog.example.com"
-    enroll_mock.assert_awaited_once_with(
-        member_zone=state.config.zone,
-        catalog_zone="catalog.example.com",
-    )
-
-
-@pytest.mark.asyncio
-async def test_setup_technitium_connection_success(mocker: MockerFixture) -> None:
-    """Test successful Technitium connection setup."""
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-    mocker.patch.object(state, "set_active_endpoint", new_callable=AsyncMock)
-
-    login_response = LoginResponse(username="admin", displayName="Admin", token="test-token")
-    mocker.patch.object(state.client, "login", new_callable=AsyncMock, return_value=login_response)
-
-    zone_result = ZonePreparationResult(
-        zone_created=False,
-        is_writable=True,
-        server_role="primary",
-        catalog_membership=None,
-    )
-    mocker.patch(
-        "external_dns_technitium_webhook.main.ensure_zone_ready",
+    """ensure_zone_ready creates missing zones and enrolls writable ones in the catalog."""
+    fake_client.responses["get_zone_options"] = list(side_effects)
+    fake_client.responses["create_zone"] = [_ZONE_CREATED]
+    catalog_mock = mocker.patch(
+        "external_dns_technitium_webhook.main.ensure_catalog_membership",
         new_callable=AsyncMock,
-        return_value=zone_result,
+        return_value=catalog_result,
     )
 
-    update_mock = mocker.patch.object(state, "update_status", new_callable=AsyncMock)
-    start_mock = mocker.patch.object(state, "start_token_renewal")
-
-    await setup_technitium_connection(state)
-
-    update_mock.assert_awaited_once_with(
-        ready=True,
-        writable=True,
-        server_role="primary",
-        catalog_membership=None,
-    )
-    start_mock.assert_called_once()
-    assert state.client.token == "test-token"
+    result = await ensure_zone_ready(state)
 
+    assert result == expected
+    assert len(fake_client.calls["create_zone"]) == int(expected.zone_created)
+    if catalog_result is None:
+        catalog_mock.assert_not_called()
+    else:
+        catalog_mock.assert_awaited_once_with(state, side_effects[-1], catalog_result)
 
-@pytest.mark.asyncio
-async def test_setup_technitium_connection_uses_failover(mocker: MockerFixture) -> None:
-    """Setup should try secondary endpoints when the first attempt fails."""
 
-    config = Config(
-        technitium_url="http://primary:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-        technitium_failover_urls="http://failover:5380",
-    )
-    state = AppState(config=config)
+@pytest.mark.parametrize("state", [_CATALOG_CONFIG], ids=["catalog"], indirect=True)
+async def test_create_default_zone(state: AppState, fake_client: FakeTechnitiumClient) -> None:
+    """Test creating default zone."""
 
-    set_endpoint_mock = mocker.patch.object(
-        state,
-        "set_active_endpoint",
-        new_callable=AsyncMock,
-    )
+    fake_client.responses["create_zone"] = [_ZONE_CREATED]
 
-    login_response = LoginResponse(username="admin", displayName="Admin", token="ok")
-    login_mock = mocker.patch.object(
-        state.client,
-        "login",
-        new_callable=AsyncMock,
-        side_effect=[RuntimeError("boom"), login_response],
-    )
+    # Should not raise any exception
+    await create_default_zone(state)
+    assert fake_client.calls["create_zone"] == [
+        call(
+            zone=state.config.zone,
+            zone_type="Primary",
+            protocol="Udp",
+            dnssec_validation=True,
+            catalog=state.config.catalog_zone_name,
+        )
+    ]
 
-    zone_result = ZonePreparationResult(
-        zone_created=False,
-        is_writable=True,
-        server_role="primary",
-        catalog_membership=None,
-    )
-    mocker.patch(
-        "external_dns_technitium_webhook.main.ensure_zone_ready",
-        new_callable=AsyncMock,
-        return_value=zone_result,
-    )
 
-    update_mock = mocker.patch.object(state, "update_status", new_callable=AsyncMock)
-    start_mock = mocker.patch.object(state, "start_token_renewal")
+class CatalogCase(NamedTuple):
+    """One ensure_catalog_membership scenario for ``catalog.example.com``.
 
-    await setup_technitium_connection(state)
+    ``create_result`` is what create_zone returns or raises if it is called;
+    ``refreshed`` is what every later get_zone_options call returns.
+    """
 
-    assert login_mock.await_count == 2
-    assert [
-        call.args[0] for call in set_endpoint_mock.await_args_list
-    ] == config.technitium_endpoints
-    update_mock.assert_awaited_once()
-    start_mock.assert_called_once()
+    options: GetZoneOptionsResponse
+    expected: str | None
+    creates: bool = False
+    enrolls: bool = False
+    create_result: object = None
+    refreshed: GetZoneOptionsResponse | None = None
+    log_contains: str | None = None
+
+
+class TestEnsureCatalogMembership:
+    """ensure_catalog_membership against the module's ``state`` and ``fake_client``."""
+
+    @pytest.mark.parametrize(
+        "case",
+        [
+            CatalogCase(_OPTIONS_ENROLLED, "catalog.example.com"),
+            CatalogCase(
+                _zone_options(None, ["Catalog.Example.com"]),
+                "catalog.example.com",
+                enrolls=True,
+                refreshed=_OPTIONS_ENROLLED,
+            ),
+            CatalogCase(
+                _OPTIONS_WITH_CATALOG_AVAILABLE,
+                "other.example.com",
+                enrolls=True,
+                refreshed=_zone_options("other.example.com", ["catalog.example.com"]),
+                log_contains="server reports membership other.example.com",
+            ),
+            CatalogCase(
+                _OPTIONS_CATALOG_MISSING,
+                "catalog.example.com",
+                creates=True,
+                enrolls=True,
+                refreshed=_OPTIONS_ENROLLED,
+            ),
+            CatalogCase(
+                _OPTIONS_CURRENT_CATALOG_MISSING,
+                "current.example.com",
+                creates=True,
+                create_result=TechnitiumError("Cannot create zone - permission denied"),
+                log_contains="Failed to create catalog zone",
+            ),
+            CatalogCase(
+                _OPTIONS_CURRENT_CATALOG_MISSING,
+                "current.example.com",
+                creates=True,
+                refreshed=_OPTIONS_CURRENT_CATALOG_MISSING,
+                log_contains="is not available on endpoint",
+            ),
+        ],
+        ids=[
+            "returns-existing-membership",
+            "enrolls-when-available",
+            "logs-mismatch",
+            "creates-zone-and-enrolls",
+            "create-fails-keeps-current",
+            "created-but-not-available",
+        ],
+    )
+    async def test_membership(
+        self,
+        state: AppState,
+        fake_client: FakeTechnitiumClient,
+        case: CatalogCase,
+        caplog: pytest.LogCaptureFixture,
+    ) -> None:
+        """Create the catalog if missing, enroll only when it is offered, report the result."""
+        fake_client.responses["create_zone"] = [case.create_result]
+        fake_client.responses["get_zone_options"] = [case.refreshed]
+        caplog.set_level("INFO", logger=main.logger.name)
+
+        membership = await ensure_catalog_membership(state, case.options, "catalog.example.com")
+
+        assert membership == case.expected
+        expected_create = [call("catalog.example.com", zone_type="Catalog")]
+        assert fake_client.calls["create_zone"] == (expected_create if case.creates else [])
+        if case.creates and not isinstance(case.create_result, BaseException):
+            # The available catalogs are re-read after creating the zone
+            assert fake_client.calls["get_zone_options"][0] == call(
+                state.config.zone, include_catalog_names=True
+            )
+        assert fake_client.calls["set_zone_options"] == []
+        expected_enroll = [call(member_zone=state.config.zone, catalog_zone="catalog.example.com")]
+        assert fake_client.calls["enroll_catalog"] == (expected_enroll if case.enrolls else [])
+        if case.log_contains:
+            assert case.log_contains in caplog.text
+
+    @pytest.mark.parametrize(
+        ("message", "raises"),
+        [
+            ("Zone not found - status code 404", False),
+            ("Catalog zone does not exist on this server", False),
+            ("Access denied - user not in DNS admin group", True),
+        ],
+        ids=["404", "does-not-exist", "other-error"],
+    )
+    async def test_enroll_fails(
+        self,
+        state: AppState,
+        fake_client: FakeTechnitiumClient,
+        message: str,
+        raises: bool,
+    ) -> None:
+        """Missing-catalog enrollment errors keep the current membership; others re-raise."""
+        options = _OPTIONS_CURRENT_CATALOG_AVAILABLE
+        fake_client.responses["enroll_catalog"] = [TechnitiumError(message)]
+
+        if raises:
+            with pytest.raises(TechnitiumError, match=re.escape(message)):
+                await ensure_catalog_membership(state, options, "catalog.example.com")
+        else:
+            result = await ensure_catalog_membership(state, options, "catalog.example.com")
+            # Should return current membership, not raise
+            assert result == "current.example.com"
+
+
+class SetupCase(NamedTuple):
+    """One setup_technitium_connection scenario; ``zone_result=None`` means never ready."""
+
+    login_results: list[object]
+    zone_result: ZonePreparationResult | None
+    log_contains: tuple[str, ...] = ()
+
+
+_PRIMARY_ZONE = ZonePreparationResult(
+    zone_created=False, is_writable=True, server_role="primary", catalog_membership=None
+)
 
 
-@pytest.mark.asyncio
-async def test_setup_connection_logs_creation_and_catalog(
-    mocker: MockerFixture, caplog: pytest.LogCaptureFixture
+@pytest.mark.parametrize(
+    ("state", "case"),
+    [
+        (_build_config(), SetupCase([_LOGIN_OK], _PRIMARY_ZONE)),
+        (_FAILOVER_CONFIG, SetupCase([RuntimeError("boom"), _LOGIN_OK], _PRIMARY_ZONE)),
+        (
+            _build_config(),
+            SetupCase(
+                [_LOGIN_OK],
+                ZonePreparationResult(
+                    zone_created=True,
+                    is_writable=True,
+                    server_role="primary",
+                    catalog_membership="catalog.example.com",
+                ),
+                (
+                    "Zone example.com created",
+                    "Zone example.com enrolled in catalog zone catalog.example.com",
+                ),
+            ),
+        ),
+        (
+            _build_config(),
+            SetupCase(
+                [_LOGIN_OK],
+                ZonePreparationResult(
+                    zone_created=False,
+                    is_writable=False,
+                    server_role="secondary",
+                    catalog_membership=None,
+                ),
+                ("read-only",),
+            ),
+        ),
+        (_NO_ENDPOINT_CONFIG, SetupCase([], None)),
+        (_build_config(), SetupCase([RuntimeError("boom")], None)),
+    ],
+    ids=[
+        "success",
+        "uses-failover",
+        "logs-creation-and-catalog",
+        "logs-read-only-warning",
+        "unhealthy-when-no-endpoints",
+        "unhealthy-after-failures",
+    ],
+    indirect=["state"],
+)
+async def test_setup_technitium_connection(
+    state: AppState,
+    fake_client: FakeTechnitiumClient,
+    case: SetupCase,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
 ) -> None:
-    """Zone creation and catalog enrollment messages should be logged."""
-
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-    caplog.set_level("INFO")
-
-    mocker.patch.object(state, "set_active_endpoint", new_callable=AsyncMock)
-    login_response = LoginResponse(username="admin", displayName="Admin", token="test")
-    mocker.patch.object(state.client, "login", new_callable=AsyncMock, return_value=login_response)
-
-    zone_result = ZonePreparationResult(
-        zone_created=True,
-        is_writable=True,
-        server_role="primary",
-        catalog_membership="catalog.example.com",
-    )
-    mocker.patch(
-        "external_dns_technitium_webhook.main.ensure_zone_ready",
-        new_callable=AsyncMock,
-        return_value=zone_result,
-    )
-
-    update_mock = mocker.patch.object(state, "update_status", new_callable=AsyncMock)
-    mocker.patch.object(state, "start_token_renewal")
-
-    try:
-        await setup_technitium_connection(state)
-    finally:
-        await state.close()
+    """Setup walks the configured endpoints and reports readiness via update_status."""
+    caplog.set_level("INFO", logger=main.logger.name)
+
+    set_endpoint_mock = AsyncMock()
+    update_mock = AsyncMock()
+    start_mock = MagicMock()
+    monkeypatch.setattr(state, "set_active_endpoint", set_endpoint_mock)
+    monkeypatch.setattr(state, "update_status", update_mock)
+    monkeypatch.setattr(state, "start_token_renewal", start_mock)
+    fake_client.responses["login"] = list(case.login_results)
+    monkeypatch.setattr(main, "ensure_zone_ready", AsyncMock(return_value=case.zone_result))
+
+    # Should not raise SystemExit, just return with service not ready on failure
+    await setup_technitium_connection(state)
 
-    update_mock.assert_awaited_once()
-    assert "Zone example.com created" in caplog.text
-    assert "Zone example.com enrolled in catalog zone catalog.example.com" in caplog.text
+    endpoints = state.config.technitium_endpoints
+    assert [c.args[0] for c in set_endpoint_mock.await_args_list] == endpoints
+    assert len(fake_client.calls["login"]) == len(endpoints)
+    if case.zone_result is None:
+        update_mock.assert_awaited_once_with(
+            ready=False,
+            writable=False,
+            server_role=None,
+            catalog_membership=None,
+        )
+        start_mock.assert_not_called()
+    else:
+        update_mock.assert_awaited_once_with(
+            ready=True,
+            writable=case.zone_result.is_writable,
+            server_role=case.zone_result.server_role,
+            catalog_membership=case.zone_result.catalog_membership,
+        )
+        start_mock.assert_called_once()
+        assert state.client.token == "test-token"
+    for text in case.log_contains:
+        assert text in caplog.text
 
 
-@pytest.mark.asyncio
-async def test_setup_connection_logs_read_only_warning(
-    mocker: MockerFixture, caplog: pytest.LogCaptureFixture
+async def test_fetch_zone_options_handles_not_found(
+    state: AppState, fake_client: FakeTechnitiumClient
 ) -> None:
-    """Read-only endpoints should log a warning."""
-
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-    caplog.set_level("WARNING")
-
-    mocker.patch.object(state, "set_active_endpoint", new_callable=AsyncMock)
-    login_response = LoginResponse(username="admin", displayName="Admin", token="test")
-    mocker.patch.object(state.client, "login", new_callable=AsyncMock, return_value=login_response)
-
-    zone_result = ZonePreparationResult(
-        zone_created=False,
-        is_writable=False,
-        server_role="secondary",
-        catalog_membership=None,
-    )
-    mocker.patch(
-        "external_dns_technitium_webhook.main.ensure_zone_ready",
-        new_callable=AsyncMock,
-        return_value=zone_result,
-    )
-
-    mocker.patch.object(state, "update_status", new_callable=AsyncMock)
-    mocker.patch.object(state, "start_token_renewal")
-
-    try:
-        await setup_technitium_connection(state)
-    finally:
-        await state.close()
-
-    assert "read-only" in caplog.text
-
-
-@pytest.mark.asyncio
-async def test_fetch_zone_options_handles_not_found(mocker: MockerFixture) -> None:
     """_fetch_zone_options should return None when the server reports missing zone."""
 
-    state = AppState(config=_build_config())
-    mocker.patch.object(
-        state.client,
-        "get_zone_options",
-        new_callable=AsyncMock,
-        side_effect=TechnitiumError("Zone not found"),
-    )
+    fake_client.responses["get_zone_options"] = [TechnitiumError("Zone not found")]
 
-    try:
-        result = await _fetch_zone_options(state, "example.com")
-    finally:
-        await state.close()
+    result = await _fetch_zone_options(state, "example.com")
 
     assert result is None
 
 
-@pytest.mark.asyncio
-async def test_fetch_zone_options_reraises_other_errors(mocker: MockerFixture) -> None:
+async def test_fetch_zone_options_reraises_other_errors(
+    state: AppState, fake_client: FakeTechnitiumClient
+) -> None:
     """Unexpected errors should propagate from _fetch_zone_options."""
 
-    state = AppState(config=_build_config())
-    mocker.patch.object(
-        state.client,
-        "get_zone_options",
-        new_callable=AsyncMock,
-        side_effect=TechnitiumError("server unavailable"),
-    )
+    fake_client.responses["get_zone_options"] = [TechnitiumError("server unavailable")]
 
     with pytest.raises(TechnitiumError):
-        try:
-            await _fetch_zone_options(state, "example.com")
-        finally:
-            await state.close()
+        await _fetch_zone_options(state, "example.com")
 
 
-@pytest.mark.asyncio
 async def test_ensure_zone_ready_raises_when_zone_missing_after_create(
-    mocker: MockerFixture,
+    state: AppState,
+    fake_client: FakeTechnitiumClient,
 ) -> None:
     """An error should be raised when zone options cannot be loaded after creation."""
 
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-
-    mocker.patch.object(
-        state.client,
-        "get_zone_options",
-        new_callable=AsyncMock,
-        side_effect=[TechnitiumError("zone not found"), None],
-    )
-    mocker.patch.object(state.client, "create_zone", new_callable=AsyncMock)
+    fake_client.responses["get_zone_options"] = [TechnitiumError("zone not found"), None]
 
     with pytest.raises(RuntimeError):
         await ensure_zone_ready(state)
 
-    await state.close()
-
-
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_logs_mismatch(
-    mocker: MockerFixture, caplog: pytest.LogCaptureFixture
-) -> None:
-    """Ensure catalog membership warns when server reports a different membership."""
-
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-    state.active_endpoint = "http://localhost:5380"
-    caplog.set_level("INFO")
-
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName=None,
-        availableCatalogZoneNames=["catalog.example.com"],
-    )
-
-    mocker.patch.object(state.client, "enroll_catalog", new_callable=AsyncMock)
-    refreshed = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName="other.example.com",
-        availableCatalogZoneNames=["catalog.example.com"],
-    )
-    mocker.patch.object(
-        state.client,
-        "get_zone_options",
-        new_callable=AsyncMock,
-        return_value=refreshed,
-    )
-
-    try:
-        membership = await ensure_catalog_membership(state, options, "catalog.example.com")
-    finally:
-        await state.close()
-    assert membership == "other.example.com"
-    assert "server reports membership other.example.com" in caplog.text
-
-
-@pytest.mark.asyncio
-async def test_setup_connection_starts_unhealthy_when_no_endpoints(
-    mocker: MockerFixture,
-) -> None:
-    """setup_technitium_connection should set not ready when no endpoints are configured."""
-
-    config = Config(
-        technitium_url=" ",  # trimmed to empty
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-    status_mock = mocker.patch.object(state, "update_status", new_callable=AsyncMock)
-
-    # Should not raise SystemExit, just return with service not ready
-    await setup_technitium_connection(state)
-    await state.close()
-
-    status_mock.assert_awaited_once_with(
-        ready=False,
-        writable=False,
-        server_role=None,
-        catalog_membership=None,
-    )
-
-
-@pytest.mark.asyncio
-async def test_setup_connection_starts_unhealthy_after_failures(
-    mocker: MockerFixture,
-) -> None:
-    """setup_technitium_connection should set not ready when all endpoints fail."""
-
-    config = Config(
-        technitium_url="http://primary:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-
-    mocker.patch.object(state, "set_active_endpoint", new_callable=AsyncMock)
-    mocker.patch.object(
-        state.client,
-        "login",
-        new_callable=AsyncMock,
-        side_effect=RuntimeError("boom"),
-    )
-    status_mock = mocker.patch.object(state, "update_status", new_callable=AsyncMock)
-
-    # Should not raise SystemExit, just return with service not ready
-    await setup_technitium_connection(state)
-    await state.close()
 
-    status_mock.assert_awaited_once_with(
-        ready=False,
-        writable=False,
-        server_role=None,
-        catalog_membership=None,
-    )
-
-
-@pytest.mark.asyncio
 async def test_setup_connection_reraises_cancelled_error(
-    mocker: MockerFixture,
+    state: AppState,
+    fake_client: FakeTechnitiumClient,
+    monkeypatch: pytest.MonkeyPatch,
 ) -> None:
     """CancelledError during endpoint init must be reraised, not swallowed."""
 
-    config = Config(
-        technitium_url="http://primary:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-
-    mocker.patch.object(state, "set_active_endpoint", new_callable=AsyncMock)
-    mocker.patch.object(
-        state.client,
-        "login",
-        new_callable=AsyncMock,
-        side_effect=asyncio.CancelledError(),
-    )
-    mocker.patch.object(state, "update_status", new_callable=AsyncMock)
+    monkeypatch.setattr(state, "set_active_endpoint", AsyncMock())
+    fake_client.responses["login"] = [asyncio.CancelledError()]
+    monkeypatch.setattr(state, "update_status", AsyncMock())
 
     with pytest.raises(asyncio.CancelledError):
         await setup_technitium_connection(state)
 
-    await state.close()
-
-
-def _build_config() -> Config:
-    """Helper to create a minimal configuration for tests."""
 
-    return Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-        domain_filters="example.com",
-    )
-
-
-def test_get_app_state_returns_state(mocker: MockerFixture) -> None:
+def test_get_app_state_returns_state(state: AppState) -> None:
     """get_app_state should return the previously stored AppState."""
 
-    mocker.patch("external_dns_technitium_webhook.app_state.TechnitiumClient")
     app = FastAPI()
-    state = AppState(config=_build_config())
     app.state.app_state = state
 
     assert get_app_state(app) is state
@@ -862,13 +639,11 @@ def test_create_state_dependency_invokes_get_app_state(mocker: MockerFixture) ->
     mocked_get.assert_called_once_with(app)
 
 
-@pytest.mark.asyncio
+@pytest.mark.slow
 async def test_lifespan_initializes_and_closes_state(mocker: MockerFixture) -> None:
     """lifespan should initialize app state and close it on shutdown."""
 
     app = FastAPI()
-    config = _build_config()
-    mocker.patch("external_dns_technitium_webhook.main.AppConfig", return_value=config)
     state = MagicMock(spec=AppState)
     state.close = AsyncMock()
     mocker.patch("external_dns_technitium_webhook.main.AppState", return_value=state)
@@ -884,13 +659,32 @@ async def test_lifespan_initializes_and_closes_state(mocker: MockerFixture) -> N
     state.close.assert_awaited_once()
 
 
-@pytest.mark.asyncio
+@pytest.mark.parametrize("served_by_run_servers", [False, True], ids=["uvicorn", "run-servers"])
+async def test_lifespan_health_thread(mocker: MockerFixture, served_by_run_servers: bool) -> None:
+    """lifespan starts the health thread unless run_servers already serves health."""
+
+    app = FastAPI()
+    if served_by_run_servers:
+        app.state.health_served_by_run_servers = True
+    state = MagicMock(spec=AppState)
+    state.close = AsyncMock()
+    mocker.patch("external_dns_technitium_webhook.main.AppState", return_value=state)
+    mocker.patch(
+        "external_dns_technitium_webhook.main.setup_technitium_connection",
+        new_callable=AsyncMock,
+    )
+    thread_mock = mocker.patch("external_dns_technitium_webhook.main.threading.Thread")
+
+    async with lifespan(app):
+        pass
+
+    assert thread_mock.called is not served_by_run_servers
+
+
 async def test_lifespan_waits_for_setup_task_on_shutdown(mocker: MockerFixture) -> None:
     """lifespan should wait for setup task to complete if it's still running during shutdown."""
 
     app = FastAPI()
-    config = _build_config()
-    mocker.patch("external_dns_technitium_webhook.main.AppConfig", return_value=config)
     state = MagicMock(spec=AppState)
     state.close = AsyncMock()
     mocker.patch("external_dns_technitium_webhook.main.AppState", return_value=state)
@@ -943,13 +737,10 @@ async def test_lifespan_waits_for_setup_task_on_shutdown(mocker: MockerFixture)
     logger_mock.info.assert_any_call("Waiting for Technitium setup to complete before shutdown...")
 
 
-@pytest.mark.asyncio
 async def test_lifespan_does_not_wait_if_setup_task_ready(mocker: MockerFixture) -> None:
     """lifespan should not wait if setup task is already done during shutdown."""
 
     app = FastAPI()
-    config = _build_config()
-    mocker.patch("external_dns_technitium_webhook.main.AppConfig", return_value=config)
     state = MagicMock(spec=AppState)
     state.close = AsyncMock()
     mocker.patch("external_dns_technitium_webhook.main.AppState", return_value=state)
@@ -975,11 +766,30 @@ async def test_lifespan_does_not_wait_if_setup_task_ready(mocker: MockerFixture)
     setup_mock.assert_awaited_once_with(state)
     state.close.assert_awaited_once()
     # Verify we did NOT log the wait message (because task was already done)
-    for call in logger_mock.info.call_args_list:
-        assert "Waiting for Technitium setup" not in str(call)
+    for logged in logger_mock.info.call_args_list:
+        assert "Waiting for Technitium setup" not in str(logged)
+
+
+@dataclass(slots=True)
+class _MiniState:
+    """The slice of AppState that auto_renew_technitium_token reads."""
+
+    config: Config
+    client: Any
+    active_endpoint: str = "http://localhost:5380"
+
+
+def _fast_sleep(seen: list[float], *, stop_after: int = 3) -> Callable[[float], Awaitable[None]]:
+    """asyncio.sleep stand-in that records delays and cancels on the ``stop_after``-th call."""
+
+    async def _sleep(delay: float) -> None:
+        seen.append(delay)
+        if len(seen) >= stop_after:
+            raise asyncio.CancelledError()
+
+    return _sleep
 
 
-@pytest.mark.asyncio
 async def test_auto_renew_token_success_sets_token(mocker: MockerFixture) -> None:
     """auto_renew_technitium_token refreshes the token after sleeping."""
 
@@ -988,28 +798,21 @@ async def test_auto_renew_token_success_sets_token(mocker: MockerFixture) -> Non
     client = SimpleNamespace(token=None)
     login_mock = AsyncMock(return_value=login_response)
     client.login = login_mock
-    state = SimpleNamespace(
-        config=config,
-        client=client,
-        active_endpoint="http://localhost:5380",
-    )
+    state = _MiniState(config=config, client=client)
 
-    sleep_mock = mocker.patch(
-        "external_dns_technitium_webhook.main.asyncio.sleep",
-        new_callable=AsyncMock,
-    )
     # Need 3 sleeps: two successful iterations, then exit on third
-    sleep_mock.side_effect = [None, None, asyncio.CancelledError()]
+    seen: list[float] = []
+    mocker.patch("external_dns_technitium_webhook.main.asyncio.sleep", new=_fast_sleep(seen))
 
     # CancelledError is used by the side_effect to break out of the loop;
     # we don't regard it as a failure in this test so suppress it.
-    from contextlib import suppress
-
     with suppress(asyncio.CancelledError):
         await auto_renew_technitium_token(cast(AppState, state))
 
     # login should be called twice (once per loop iteration)
     assert login_mock.await_count == 2
+    # Every sleep between renewals uses the 20-minute success interval
+    assert seen == [20 * 60] * 3
     login_mock.assert_awaited_with(
         username=config.technitium_username,
         password=config.technitium_password,
@@ -1017,7 +820,6 @@ async def test_auto_renew_token_success_sets_token(mocker: MockerFixture) -> Non
     assert state.client.token == "renewed"
 
 
-@pytest.mark.asyncio
 async def test_auto_renew_token_failure_uses_failure_interval(mocker: MockerFixture) -> None:
     """auto_renew_technitium_token should retry quickly after a failure."""
 
@@ -1025,19 +827,10 @@ async def test_auto_renew_token_failure_uses_failure_interval(mocker: MockerFixt
     client = SimpleNamespace(token="unchanged")
     login_mock = AsyncMock(side_effect=RuntimeError("boom"))
     client.login = login_mock
-    state = SimpleNamespace(
-        config=config,
-        client=client,
-        active_endpoint="http://localhost:5380",
-    )
-    # Mock the try_failback_to_primary method (won't be called on failure)
-    state.try_failback_to_primary = AsyncMock(return_value=False)
+    state = _MiniState(config=config, client=client)
 
-    sleep_mock = mocker.patch(
-        "external_dns_technitium_webhook.main.asyncio.sleep",
-        new_callable=AsyncMock,
-    )
-    sleep_mock.side_effect = [None, None, asyncio.CancelledError()]
+    seen: list[float] = []
+    mocker.patch("external_dns_technitium_webhook.main.asyncio.sleep", new=_fast_sleep(seen))
 
     # Mock time to ensure failback timing logic works
     time_mock = mocker.patch("external_dns_technitium_webhook.main.asyncio.get_event_loop")
@@ -1045,17 +838,13 @@ async def test_auto_renew_token_failure_uses_failure_interval(mocker: MockerFixt
     mock_loop.time.return_value = 0.0  # time() always returns 0 so failback not triggered
     time_mock.return_value = mock_loop
 
-    from contextlib import suppress
-
     with suppress(asyncio.CancelledError):
         await auto_renew_technitium_token(cast(AppState, state))
 
-    assert sleep_mock.await_args_list[0].args[0] == 20 * 60
-    assert sleep_mock.await_args_list[1].args[0] == 60
+    assert seen[:2] == [20 * 60, 60]
     assert state.client.token == "unchanged"
 
 
-@pytest.mark.asyncio
 async def test_auto_attempt_failback_skips_when_no_endpoints(mocker: MockerFixture) -> None:
     """Failback polling should continue cleanly when no endpoints are configured."""
 
@@ -1081,7 +870,6 @@ async def test_auto_attempt_failback_skips_when_no_endpoints(mocker: MockerFixtu
         await auto_attempt_failback(cast(AppState, state))
 
 
-@pytest.mark.asyncio
 async def test_auto_attempt_failback_primary_readonly_triggers_failover(
     mocker: MockerFixture,
 ) -> None:
@@ -1120,7 +908,6 @@ async def test_auto_attempt_failback_primary_readonly_triggers_failover(
     state.try_failover_endpoints.assert_awaited_once_with()
 
 
-@pytest.mark.asyncio
 async def test_auto_attempt_failback_primary_stays_put_when_writable(
     mocker: MockerFixture,
 ) -> None:
@@ -1159,7 +946,6 @@ async def test_auto_attempt_failback_primary_stays_put_when_writable(
     state.try_failover_endpoints.assert_not_awaited()
 
 
-@pytest.mark.asyncio
 async def test_auto_attempt_failback_primary_health_check_warning_branch(
     mocker: MockerFixture,
 ) -> None:
@@ -1199,7 +985,6 @@ async def test_auto_attempt_failback_primary_health_check_warning_branch(
     state.try_failover_endpoints.assert_not_awaited()
 
 
-@pytest.mark.asyncio
 async def test_auto_attempt_failback_primary_readonly_successful_failover(
     mocker: MockerFixture,
 ) -> None:
@@ -1237,7 +1022,6 @@ async def test_auto_attempt_failback_primary_readonly_successful_failover(
     state.try_failover_endpoints.assert_awaited_once_with()
 
 
-@pytest.mark.asyncio
 async def test_auto_attempt_failback_cancels_during_primary_health_check(
     mocker: MockerFixture,
 ) -> None:
@@ -1270,7 +1054,6 @@ async def test_auto_attempt_failback_cancels_during_primary_health_check(
     sleep_mock.assert_awaited_once_with(config.health_polling_interval_seconds)
 
 
-@pytest.mark.asyncio
 async def test_auto_attempt_failback_recovers_to_writable_primary(
     mocker: MockerFixture,
 ) -> None:
@@ -1331,7 +1114,6 @@ async def test_auto_attempt_failback_recovers_to_writable_primary(
     assert state.client.token == "renewed-primary-token"
 
 
-@pytest.mark.asyncio
 async def test_auto_attempt_failback_keeps_failover_when_primary_is_readonly(
     mocker: MockerFixture,
 ) -> None:
@@ -1381,7 +1163,6 @@ async def test_auto_attempt_failback_keeps_failover_when_primary_is_readonly(
     temp_client.close.assert_awaited_once_with()
 
 
-@pytest.mark.asyncio
 async def test_auto_attempt_failback_primary_check_exception_branch(
     mocker: MockerFixture,
 ) -> None:
@@ -1431,7 +1212,6 @@ async def test_auto_attempt_failback_primary_check_exception_branch(
     )
 
 
-@pytest.mark.asyncio
 async def test_auto_attempt_failback_logs_outer_polling_errors(
     mocker: MockerFixture,
 ) -> None:
@@ -1466,12 +1246,14 @@ async def test_auto_attempt_failback_logs_outer_polling_errors(
     )
 
 
-def test_app_routes_delegate_to_handlers(mocker: MockerFixture) -> None:
+@pytest.mark.slow
+async def test_app_routes_delegate_to_handlers(
+    built_app: FastAPI,
+    state: AppState,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
     """Routes defined in create_app should delegate to underlying handlers."""
 
-    mocker.patch("external_dns_technitium_webhook.app_state.TechnitiumClient")
-
-    state = AppState(config=_build_config())
     state.is_ready = True
 
     # Patch state.ensure_writable to a no-op sync function
@@ -1480,32 +1262,18 @@ def test_app_routes_delegate_to_handlers(mocker: MockerFixture) -> None:
 
     state.ensure_writable = noop
 
-    @asynccontextmanager
-    async def _dummy_lifespan(_app: FastAPI):
-        yield
-
-    mocker.patch("external_dns_technitium_webhook.main.lifespan", _dummy_lifespan)
-    app = create_app()
-    app.state.app_state = state
+    monkeypatch.setattr(built_app.state, "app_state", state, raising=False)
 
-    negotiate_mock = mocker.patch(
-        "external_dns_technitium_webhook.handlers.negotiate_domain_filter",
-        side_effect=real_negotiate_domain_filter,
-    )
+    negotiate_mock = MagicMock(side_effect=handlers.negotiate_domain_filter)
+    monkeypatch.setattr(handlers, "negotiate_domain_filter", negotiate_mock)
     # Patch state.client.get_records to be an AsyncMock returning an empty list
     state.client.get_records = AsyncMock(return_value=SimpleNamespace(records=[]))
-    records_mock = mocker.patch(
-        "external_dns_technitium_webhook.handlers.get_records",
-        side_effect=real_get_records,
-    )
-    adjust_mock = mocker.patch(
-        "external_dns_technitium_webhook.handlers.adjust_endpoints",
-        side_effect=real_adjust_endpoints,
-    )
-    apply_mock = mocker.patch(
-        "external_dns_technitium_webhook.handlers.apply_record",
-        side_effect=real_apply_record,
-    )
+    records_mock = AsyncMock(side_effect=handlers.get_records)
+    monkeypatch.setattr(handlers, "get_records", records_mock)
+    adjust_mock = MagicMock(side_effect=handlers.adjust_endpoints)
+    monkeypatch.setattr(handlers, "adjust_endpoints", adjust_mock)
+    apply_mock = AsyncMock(side_effect=handlers.apply_record)
+    monkeypatch.setattr(handlers, "apply_record", apply_mock)
 
     endpoint_payload = [
         {
@@ -1521,16 +1289,17 @@ def test_app_routes_delegate_to_handlers(mocker: MockerFixture) -> None:
         "delete": [],
     }
 
-    with TestClient(app) as client:
-        response = client.get("/")
+    transport = httpx.ASGITransport(app=built_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/")
         assert response.status_code == 200
         assert response.json() == {"filters": ["example.com"], "exclude": []}
 
-        response = client.get("/records")
+        response = await client.get("/records")
         assert response.status_code == 200
         assert response.json() == []
 
-        response = client.post("/adjustendpoints", json=endpoint_payload)
+        response = await client.post("/adjustendpoints", json=endpoint_payload)
         assert response.status_code == 200
         # The handler returns the normalized endpoint(s) as a list
         assert response.json() == [
@@ -1545,7 +1314,7 @@ def test_app_routes_delegate_to_handlers(mocker: MockerFixture) -> None:
             }
         ]
 
-        response = client.post("/records", json=changes_payload)
+        response = await client.post("/records", json=changes_payload)
         assert response.status_code == 204
 
     negotiate_mock.assert_called_once_with(state)
@@ -1554,52 +1323,6 @@ def test_app_routes_delegate_to_handlers(mocker: MockerFixture) -> None:
     apply_mock.assert_awaited_once_with(state, ANY)
 
 
-def test_create_health_app() -> None:
-    """Test health app creation."""
-    from external_dns_technitium_webhook.health import create_health_app
-
-    app = create_health_app()
-
-    assert isinstance(app, FastAPI)
-    assert app.title == "ExternalDNS Technitium Webhook - Health"
-    assert app.description == "Health check endpoint for ExternalDNS Technitium webhook"
-    from external_dns_technitium_webhook import __version__
-
-    assert app.version == __version__
-    assert app.docs_url is None
-    assert app.redoc_url is None
-    assert app.openapi_url is None
-
-    # Check health endpoint exists
-    from fastapi.routing import APIRoute
-
-    routes = [route.path for route in app.routes if isinstance(route, APIRoute)]
-    assert "/health" in routes
-
-
-def test_run_servers_startup_and_shutdown(mocker):
-    """Test run_servers function starts both servers properly."""
-    # Mock the server.run_servers function which is what main() calls
-    mock_run_servers = mocker.patch("external_dns_technitium_webhook.server.run_servers")
-
-    from external_dns_technitium_webhook.main import main
-
-    # Mock dependencies
-    mock_health_app = mocker.Mock()
-    mocker.patch(
-        "external_dns_technitium_webhook.health.create_health_app", return_value=mock_health_app
-    )
-    mock_config = mocker.Mock()
-    mocker.patch("external_dns_technitium_webhook.main.AppConfig", return_value=mock_config)
-
-    # Call main which should call run_servers
-    with suppress(SystemExit, Exception):
-        main()
-
-    # Verify run_servers was called
-    mock_run_servers.assert_called_once()
-
-
 def test_main_entry_point(mocker):
     """Test the main() entry point function."""
     # app is now created at module import time, so we can't mock create_app after import.
@@ -1610,414 +1333,31 @@ def test_main_entry_point(mocker):
     mock_run_servers = mocker.patch("external_dns_technitium_webhook.server.run_servers")
     mock_config = mocker.patch("external_dns_technitium_webhook.main.AppConfig")
 
-    from external_dns_technitium_webhook.main import main
-
-    main()
+    main.main()
 
     mock_create_health_app.assert_called_once()
     mock_config.assert_called_once()
     mock_run_servers.assert_called_once()
 
 
-def test_main_function(mocker: MockerFixture) -> None:
-    """Test the main function to ensure it executes."""
+@pytest.mark.parametrize("stub_config", [False, True], ids=["module-config", "mock-config"])
+def test_main_function(mocker: MockerFixture, stub_config: bool) -> None:
+    """main() hands the app, health app and loaded config to run_servers."""
     # Mock run_servers to prevent actual server startup
     mock_run_servers = mocker.patch("external_dns_technitium_webhook.server.run_servers")
+    config = _build_config()
+    if stub_config:
+        config = mocker.Mock()
+        mocker.patch("external_dns_technitium_webhook.main.AppConfig", return_value=config)
 
-    mocker.patch(
-        "external_dns_technitium_webhook.main.AppConfig",
-        return_value=Config(
-            technitium_url="http://localhost:5380",
-            technitium_username="admin",
-            technitium_password="password",
-            zone="example.com",
-            domain_filters="example.com",
-        ),
-    )
-
-    # Import and execute the main function
-    from external_dns_technitium_webhook.main import main
-
-    try:
-        main()  # Ensure no exceptions are raised
-    except SystemExit as e:
-        # main() might call sys.exit(), which raises SystemExit
-        assert e.code == 0, "main() did not exit cleanly"
-
-    # Verify run_servers was called
-    mock_run_servers.assert_called_once()
-
-
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership(mocker: MockerFixture) -> None:
-    """Test ensure_catalog_membership behavior."""
-    state = mocker.Mock()
-    state.active_endpoint = "http://localhost:5380"
-    state.config.zone = "example.com"
-
-    options = mocker.Mock()
-    options.catalog_zone_name = "current.example.com"
-    options.available_catalog_zone_names = ["catalog.example.com"]
-
-    # Mock client methods
-    enroll_mock = mocker.patch.object(state.client, "enroll_catalog", new_callable=AsyncMock)
-    get_zone_mock = mocker.patch.object(
-        state.client,
-        "get_zone_options",
-        new_callable=AsyncMock,
-        return_value=mocker.Mock(catalog_zone_name="catalog.example.com"),
-    )
-
-    # Call the function
-    result = await ensure_catalog_membership(state, options, "catalog.example.com")
-
-    # Assertions
-    enroll_mock.assert_awaited_once_with(
-        member_zone="example.com", catalog_zone="catalog.example.com"
-    )
-    get_zone_mock.assert_awaited_once_with("example.com", include_catalog_names=False)
-    assert result == "catalog.example.com"
-
-
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_unavailable_zone(mocker: MockerFixture) -> None:
-    """Test ensure_catalog_membership when the desired catalog zone is unavailable."""
-    state = mocker.Mock()
-    state.active_endpoint = "http://localhost:5380"
-    state.config.zone = "example.com"
-
-    options = mocker.Mock()
-    options.catalog_zone_name = "current.example.com"
-    options.available_catalog_zone_names = ["other.example.com"]
-
-    # Mock create_zone to fail
-    mocker.patch.object(
-        state.client,
-        "create_zone",
-        new_callable=AsyncMock,
-        side_effect=TechnitiumError("Cannot create catalog zone"),
-    )
-
-    # Call the function
-    result = await ensure_catalog_membership(state, options, "catalog.example.com")
-
-    # Assertions
-    assert result == "current.example.com"
-
-
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_different_membership(mocker: MockerFixture) -> None:
-    """Test ensure_catalog_membership when the server reports a different membership after enrollment."""
-    state = mocker.Mock()
-    state.active_endpoint = "http://localhost:5380"
-    state.config.zone = "example.com"
-
-    options = mocker.Mock()
-    options.catalog_zone_name = "current.example.com"
-    options.available_catalog_zone_names = ["catalog.example.com"]
-
-    # Mock client methods
-    enroll_mock = mocker.patch.object(state.client, "enroll_catalog", new_callable=AsyncMock)
-    get_zone_mock = mocker.patch.object(
-        state.client,
-        "get_zone_options",
-        new_callable=AsyncMock,
-        return_value=mocker.Mock(catalog_zone_name="other.example.com"),
-    )
-
-    # Call the function
-    result = await ensure_catalog_membership(state, options, "catalog.example.com")
-
-    # Assertions
-    enroll_mock.assert_awaited_once_with(
-        member_zone="example.com", catalog_zone="catalog.example.com"
-    )
-    get_zone_mock.assert_awaited_once_with("example.com", include_catalog_names=False)
-    assert result == "other.example.com"
-
-
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_creates_zone_and_enrolls(
-    mocker: MockerFixture,
-) -> None:
-    """Test successful catalog zone creation when not available, then enrollment."""
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-
-    # Initially, catalog zone is not available
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName=None,
-        availableCatalogZoneNames=["other.example.com"],  # catalog.example.com NOT here
-    )
-
-    # After creation, it becomes available
-    refreshed = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName="catalog.example.com",  # Now enrolled
-        availableCatalogZoneNames=["catalog.example.com"],  # Now available
-    )
-
-    # Mock the client methods
-    create_zone_mock = mocker.patch.object(state.client, "create_zone", new_callable=AsyncMock)
-    get_zone_mock = mocker.patch.object(
-        state.client,
-        "get_zone_options",
-        new_callable=AsyncMock,
-        return_value=refreshed,
-    )
-    enroll_mock = mocker.patch.object(state.client, "enroll_catalog", new_callable=AsyncMock)
-
-    try:
-        result = await ensure_catalog_membership(state, options, "catalog.example.com")
-    finally:
-        await state.close()
-
-    # Verify: create_zone was called for the catalog zone
-    create_zone_mock.assert_awaited_once_with("catalog.example.com", zone_type="Catalog")
-    # Verify: get_zone_options was called to refresh available zones with include_catalog_names=True
-    # Check that at least one call had include_catalog_names=True
-    calls_with_catalog = [
-        call
-        for call in get_zone_mock.await_args_list
-        if call.kwargs.get("include_catalog_names") is True
-    ]
-    assert len(calls_with_catalog) > 0, "Expected at least one call with include_catalog_names=True"
-    # Verify: enroll_catalog was called
-    enroll_mock.assert_awaited_once_with(
-        member_zone=state.config.zone,
-        catalog_zone="catalog.example.com",
-    )
-    # Verify: returned the new membership
-    assert result == "catalog.example.com"
-
-
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_enroll_fails_with_404(
-    mocker: MockerFixture,
-) -> None:
-    """Test enrollment failure with 'not found' error - should return current membership."""
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName="current.example.com",
-        availableCatalogZoneNames=["catalog.example.com"],
-    )
-
-    # Mock enroll_catalog to raise "not found" error
-    mocker.patch.object(
-        state.client,
-        "enroll_catalog",
-        new_callable=AsyncMock,
-        side_effect=TechnitiumError("Zone not found - status code 404"),
-    )
-
-    try:
-        result = await ensure_catalog_membership(state, options, "catalog.example.com")
-    finally:
-        await state.close()
-
-    # Should return current membership, not raise
-    assert result == "current.example.com"
-
-
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_enroll_fails_with_does_not_exist(
-    mocker: MockerFixture,
-) -> None:
-    """Test enrollment failure with 'does not exist' error - should return current membership."""
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName="current.example.com",
-        availableCatalogZoneNames=["catalog.example.com"],
-    )
-
-    # Mock enroll_catalog to raise "does not exist" error
-    mocker.patch.object(
-        state.client,
-        "enroll_catalog",
-        new_callable=AsyncMock,
-        side_effect=TechnitiumError("Catalog zone does not exist on this server"),
-    )
-
-    try:
-        result = await ensure_catalog_membership(state, options, "catalog.example.com")
-    finally:
-        await state.close()
-
-    # Should return current membership, not raise
-    assert result == "current.example.com"
-
-
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_enroll_fails_with_other_error(
-    mocker: MockerFixture,
-) -> None:
-    """Test enrollment failure with unexpected error - should re-raise."""
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName="current.example.com",
-        availableCatalogZoneNames=["catalog.example.com"],
-    )
-
-    # Mock enroll_catalog to raise a different error
-    error = TechnitiumError("Access denied - user not in DNS admin group")
-    mocker.patch.object(
-        state.client,
-        "enroll_catalog",
-        new_callable=AsyncMock,
-        side_effect=error,
-    )
-
-    try:
-        with pytest.raises(TechnitiumError, match="Access denied"):
-            await ensure_catalog_membership(state, options, "catalog.example.com")
-    finally:
-        await state.close()
-
-
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_create_zone_fails(
-    mocker: MockerFixture,
-) -> None:
-    """Test catalog zone creation failure - should return current membership."""
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName="current.example.com",
-        availableCatalogZoneNames=["other.example.com"],  # catalog.example.com NOT available
-    )
-
-    # Mock create_zone to fail
-    mocker.patch.object(
-        state.client,
-        "create_zone",
-        new_callable=AsyncMock,
-        side_effect=TechnitiumError("Cannot create zone - permission denied"),
-    )
-
-    try:
-        result = await ensure_catalog_membership(state, options, "catalog.example.com")
-    finally:
-        await state.close()
-
-    # Should return current membership when creation fails
-    assert result == "current.example.com"
-
-
-@pytest.mark.asyncio
-async def test_ensure_catalog_membership_zone_created_but_not_available(
-    mocker: MockerFixture,
-) -> None:
-    """Test when zone creation succeeds but zone is still not in available list."""
-    config = Config(
-        technitium_url="http://localhost:5380",
-        technitium_username="admin",
-        technitium_password="password",
-        zone="example.com",
-    )
-    state = AppState(config=config)
-
-    # Initial options: catalog not available
-    options = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName="current.example.com",
-        availableCatalogZoneNames=["other.example.com"],  # No catalog.example.com
-    )
-
-    # After creation, still not available (e.g., zone created but not in catalog list)
-    refreshed = GetZoneOptionsResponse(
-        name=config.zone,
-        isCatalogZone=False,
-        isReadOnly=False,
-        catalogZoneName="current.example.com",
-        availableCatalogZoneNames=["other.example.com"],  # Still no catalog.example.com
-    )
-
-    # Mock the client methods
-    create_zone_mock = mocker.patch.object(state.client, "create_zone", new_callable=AsyncMock)
-    mocker.patch.object(
-        state.client,
-        "get_zone_options",
-        new_callable=AsyncMock,
-        return_value=refreshed,
-    )
-
-    try:
-        result = await ensure_catalog_membership(state, options, "catalog.example.com")
-    finally:
-        await state.close()
-
-    # Should have called create_zone
-    create_zone_mock.assert_awaited_once_with("catalog.example.com", zone_type="Catalog")
-    # Should return current membership (not enrolled in desired catalog)
-    assert result == "current.example.com"
-
-
-def test_import_main() -> None:
-    """Ensure main.py can be imported without errors."""
-    import sys
+    main.main()
 
-    assert "external_dns_technitium_webhook.main" in sys.modules
+    mock_run_servers.assert_called_once_with(main.app, ANY, config)
 
 
-@pytest.mark.asyncio
 async def test_lifespan_handles_rate_limiter_exception(mocker: MockerFixture) -> None:
     """If configure_rate_limiter raises during startup, lifespan should continue and log the exception."""
-    from external_dns_technitium_webhook import main as main_mod
-
     app = FastAPI()
-    config = _build_config()
-    mocker.patch("external_dns_technitium_webhook.main.AppConfig", return_value=config)
 
     # Make configure_rate_limiter raise
     mocker.patch(
@@ -2035,9 +1375,9 @@ async def test_lifespan_handles_rate_limiter_exception(mocker: MockerFixture) ->
     )
 
     # Patch logger.exception
-    exc_mock = mocker.patch.object(main_mod.logger, "exception")
+    exc_mock = mocker.patch.object(main.logger, "exception")
 
-    async with main_mod.lifespan(app):
+    async with main.lifespan(app):
         assert app.state.app_state is state
 
     exc_mock.assert_called()
@@ -2045,132 +1385,62 @@ async def test_lifespan_handles_rate_limiter_exception(mocker: MockerFixture) ->
 
 def test_exception_group_handler_logs_and_returns_500(mocker: MockerFixture) -> None:
     """Ensure exception_group_handler logs the exception group and returns 500."""
-    from external_dns_technitium_webhook import main as main_mod
-
     # Build the app via create_app so the ExceptionGroup handler is registered
-    mocker.patch("external_dns_technitium_webhook.main.AppConfig", return_value=_build_config())
-    app = main_mod.create_app()
+    app = main.create_app()
 
     # Patch logger.exception
-    log_exc = mocker.patch.object(main_mod.logger, "exception")
-
-    try:
+    log_exc = mocker.patch.object(main.logger, "exception")
 
-        @app.get("/eg")
-        async def _eg():
-            raise ExceptionGroup("group", [ValueError("a")])
+    @app.get("/eg")
+    async def _eg():
+        raise ExceptionGroup("group", [ValueError("a")])
 
-        client = TestClient(app)
-        response = client.get("/eg")
-        assert response.status_code == 500
-        assert log_exc.called
-    except NameError:
-        pytest.skip("ExceptionGroup not available")
-
-
-def test_force_import_main() -> None:
-    """Force import of main.py to ensure coverage."""
-    import sys
-
-    assert "external_dns_technitium_webhook.main" in sys.modules
-
-
-def test_coverage_process_startup() -> None:
-    """Test coverage.process_startup() call in main.py."""
-    # This test verifies that the coverage.process_startup() call is executed
-    # Re-import main to trigger the coverage hook
-    import sys
-
-    # Remove from sys.modules to force reimport, then re-import to trigger coverage hook
-    if "external_dns_technitium_webhook.main" in sys.modules:
-        del sys.modules["external_dns_technitium_webhook.main"]
-
-    # Import fresh to trigger coverage.process_startup()
-    import importlib
-
-    main_module = importlib.import_module("external_dns_technitium_webhook.main")
-
-    # Verify the module is loaded
-    assert main_module is not None
-
-
-def test_main_function_imports(mocker: MockerFixture) -> None:
-    """Test that main() function properly imports health and server modules."""
-    # Mock main() to prevent it from actually starting servers
-    mock_main = mocker.patch("external_dns_technitium_webhook.main.main")
-
-    # Import main function
-    from external_dns_technitium_webhook.main import main
-
-    # Call main - this will trigger the imports inside the function
-    with suppress(SystemExit, Exception):
-        main()
+    client = TestClient(app)
+    response = client.get("/eg")
+    assert response.status_code == 500
+    assert log_exc.called
 
-    # Verify main was called (but mocked, so no servers started)
-    mock_main.assert_called_once()
 
-
-def test_main_if_name_main(mocker: MockerFixture) -> None:
-    """Test that __name__ == '__main__' block can be executed."""
-    # Mock main() to prevent it from actually starting servers
-    mock_main = mocker.patch("external_dns_technitium_webhook.main.main")
-
-    # Import main function
-    from external_dns_technitium_webhook.main import main
-
-    # This should execute without errors (may exit)
-    with suppress(SystemExit, Exception):
-        main()
-
-    # Verify main was called (but mocked, so no servers started)
-    mock_main.assert_called_once()
-
-
-def test_env_defaults_respect_existing_values(monkeypatch: pytest.MonkeyPatch) -> None:
-    """Test that module-level env defaults don't override already-set values.
-
-    When environment variables are set before the module is imported,
-    the default fallbacks should not overwrite them.
-    """
-    # Set custom values (simulating container deployment with env vars)
+def test_config_reads_values_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Config should pick up deployment-provided environment variables."""
     monkeypatch.setenv("TECHNITIUM_URL", "https://custom.example.com:5380")
     monkeypatch.setenv("TECHNITIUM_USERNAME", "custom_user")
     monkeypatch.setenv("TECHNITIUM_PASSWORD", "custom_pass")
     monkeypatch.setenv("ZONE", "custom.zone")
 
-    # Verify the values are set and would not be overwritten by defaults
-    assert os.environ["TECHNITIUM_URL"] == "https://custom.example.com:5380"
-    assert os.environ["TECHNITIUM_USERNAME"] == "custom_user"
-    assert os.environ["TECHNITIUM_PASSWORD"] == "custom_pass"
-    assert os.environ["ZONE"] == "custom.zone"
-    # Also verify defaults are NOT applied
-    assert os.environ["TECHNITIUM_URL"] != "http://localhost:5380"
-    assert os.environ["TECHNITIUM_USERNAME"] != "admin"
-    assert os.environ["TECHNITIUM_PASSWORD"] != "password"
-    assert os.environ["ZONE"] != "example.com"
+    config = Config()
+
+    assert config.technitium_url == "https://custom.example.com:5380"
+    assert config.technitium_username == "custom_user"
+    assert config.technitium_password == "custom_pass"
+    assert config.zone == "custom.zone"
 
 
 class TestStructuredFormatterApplication:
     """Tests for formatter application to external loggers (main.py)."""
 
-    def test_apply_structured_formatter_to_uvicorn(self):
-        logger_name = "test_uvicorn"
-        logger = logging.getLogger(logger_name)
-        handler = logging.StreamHandler()
-        logger.addHandler(handler)
+    @pytest.fixture
+    def named_logger(self, request: pytest.FixtureRequest) -> Iterator[tuple[str, logging.Logger]]:
+        """Yield a fresh logger (with one NullHandler) named after the test, then drop it."""
+        name = request.node.name
+        logger = logging.getLogger(name)
+        logger.handlers.clear()
+        logger.addHandler(logging.NullHandler())
+        yield name, logger
+        logger.handlers.clear()
+        logging.Logger.manager.loggerDict.pop(name, None)
+
+    def test_apply_structured_formatter_to_uvicorn(self, named_logger):
+        logger_name, logger = named_logger
 
         _apply_structured_formatter_to_logger(logger_name)
 
         assert isinstance(logger.handlers[0].formatter, StructuredFormatter)
 
-    def test_apply_formatter_sets_propagate_true(self):
-        logger_name = "test_propagate"
-        logger = logging.getLogger(logger_name)
+    def test_apply_formatter_sets_propagate_true(self, named_logger):
+        logger_name, logger = named_logger
         logger.propagate = False  # Set to False initially
 
-        handler = logging.StreamHandler()
-        logger.addHandler(handler)
-
         _apply_structured_formatter_to_logger(logger_name)
 
         assert logger.propagate is True
@@ -2211,6 +1481,30 @@ class TestNormalizeCatalogMembership:
         assert _normalize_catalog_membership(".") is None
 
 
+# (message, expected status, expected error snippet) for runtime_error_handler
+_RUNTIME_ERROR_CASES = [
+    ("SERVICE NOT READY YET - try again", 503, "Service not ready yet"),
+    ("Some other database error", 500, "Internal server error"),
+    ("not ready yet", 503, "Service not ready yet"),
+]
+
+
+@pytest.fixture(scope="module")
+def runtime_error_client() -> Iterator[TestClient]:
+    """One app with a route raising RuntimeError(_RUNTIME_ERROR_CASES[msg_id])."""
+    # The dummy lifespan leaves app_state unset, so the handler falls back to
+    # message-based readiness detection
+    with patch("external_dns_technitium_webhook.main.lifespan", _dummy_lifespan):
+        app = create_app()
+
+    @app.get("/test-runtime/{msg_id}")
+    async def raise_runtime_error(msg_id: int):
+        raise RuntimeError(_RUNTIME_ERROR_CASES[msg_id][0])
+
+    with TestClient(app) as client:
+        yield client
+
+
 class TestExceptionHandlersAndMiddleware:
     def test_runtime_error_service_not_ready(self, mocker):
         app = create_app()
@@ -2290,7 +1584,6 @@ class TestExceptionHandlersAndMiddleware:
         assert response.status_code == 500
         assert response.json().get("error") == "Internal server error"
 
-    @pytest.mark.asyncio
     async def test_domain_filter_keyboard_interrupt_propagates(self, mocker):
         """KeyboardInterrupt inside domain_filter must re-raise, not be swallowed."""
         app = create_app()
@@ -2323,7 +1616,6 @@ class TestExceptionHandlersAndMiddleware:
 
 
 class TestMainMiddlewareFunctions:
-    @pytest.mark.asyncio
     async def test_exception_logging_middleware_service_not_ready(self):
         async def call_next_error(_request):
             raise Exception("Service not ready yet")
@@ -2342,7 +1634,6 @@ class TestMainMiddlewareFunctions:
         request.url.path = "/records"
         return request
 
-    @pytest.mark.asyncio
     async def test_log_requests_middleware_logs_info_level(self, mock_request, caplog):
         """Verify log_requests_middleware logs at INFO level for request/response."""
 
@@ -2358,7 +1649,6 @@ class TestMainMiddlewareFunctions:
         assert "Request:" in caplog.text
         assert "Response:" in caplog.text
 
-    @pytest.mark.asyncio
     async def test_exception_logging_middleware_general_exception(self):
         """Test middleware handles general exceptions with 500 response."""
 
@@ -2371,7 +1661,6 @@ class TestMainMiddlewareFunctions:
         assert response.status_code == 500
         assert response.body == b'{"message":"Internal Server Error"}'
 
-    @pytest.mark.asyncio
     async def test_exception_logging_middleware_exception_group(self):
         """Test middleware handles ExceptionGroup exceptions."""
 
@@ -2409,67 +1698,30 @@ class TestMainMiddlewareFunctions:
             return state
 
         app.dependency_overrides[get_app_state] = get_state_override
-        client = TestClient(app)
-
-        # Trigger ExceptionGroup if available in Python 3.11+
-        try:
-            exec(
-                """
-@app.get("/test-group")
-async def trigger_exception_group():
-    raise ExceptionGroup("test", [ValueError("test")])
-"""
-            )
-            response = client.get("/test-group")
-            assert response.status_code == 500
-        except Exception:
-            # Skip if ExceptionGroup not available
-            pytest.skip("ExceptionGroup not available in this Python version")
-
-    def test_runtime_error_handler_not_ready_message_case_insensitive(self, mocker):
-        """Test runtime error handler detects various not-ready messages (case-insensitive)."""
-        app = create_app()
-        client = TestClient(app)
-
-        @app.get("/test-not-ready")
-        async def test_route():
-            raise RuntimeError("SERVICE NOT READY YET - try again")
 
-        response = client.get("/test-not-ready")
-        assert response.status_code == 503
-        assert "Service not ready yet" in response.json().get("error", "")
+        @app.get("/test-group")
+        async def trigger_exception_group():
+            raise ExceptionGroup("test", [ValueError("test")])
 
-    def test_runtime_error_handler_other_error_returns_500(self, mocker):
-        """Test runtime error handler returns 500 for other errors."""
-        app = create_app()
         client = TestClient(app)
-
-        @app.get("/test-other-error")
-        async def test_route():
-            raise RuntimeError("Some other database error")
-
-        response = client.get("/test-other-error")
+        response = client.get("/test-group")
         assert response.status_code == 500
-        assert "Internal server error" in response.json().get("error", "")
-
-    def test_runtime_error_handler_state_fetch_exception(self, mocker):
-        """Test runtime error handler when get_app_state raises exception."""
-        app = create_app()
-        client = TestClient(app)
 
-        # Mock get_app_state to raise an exception
-        def failing_get_state(_):
-            raise RuntimeError("Failed to get app state")
-
-        app.dependency_overrides[get_app_state] = failing_get_state
+    @pytest.mark.parametrize(
+        "msg_id",
+        range(len(_RUNTIME_ERROR_CASES)),
+        ids=["not-ready-uppercase", "other-error", "not-ready-lowercase"],
+    )
+    def test_runtime_error_handler_message_detection(
+        self, runtime_error_client: TestClient, msg_id: int
+    ) -> None:
+        """Runtime error handler maps not-ready messages (any case) to 503, others to 500."""
+        _, expected_status, expected_snippet = _RUNTIME_ERROR_CASES[msg_id]
 
-        @app.get("/test-bad-state")
-        async def test_route():
-            raise RuntimeError("not ready yet")
+        response = runtime_error_client.get(f"/test-runtime/{msg_id}")
 
-        response = client.get("/test-bad-state")
-        # Should still detect "not ready yet" from message and return 503
-        assert response.status_code == 503
+        assert response.status_code == expected_status
+        assert expected_snippet in response.json().get("error", "")
 
     def test_runtime_error_handler_without_app_state_falls_back_to_message(self):
         """Missing app state should fall back to message-based readiness detection."""
@@ -2488,9 +1740,7 @@ async def trigger_exception_group():
 
     def test_runtime_error_handler_state_unready_early_branch(self, mocker):
         """When app state reports ready=False, runtime_error_handler should return 503 immediately."""
-        from external_dns_technitium_webhook import main as main_mod
-
-        app = main_mod.create_app()
+        app = main.create_app()
         state = mocker.MagicMock(spec=AppState)
         state.ensure_ready = mocker.Mock()
         state.ready = False
@@ -2516,9 +1766,7 @@ async def trigger_exception_group():
     def test_runtime_error_handler_state_ready_uses_text_fallback(self, mocker):
         """When state is available but ready is not False, text detection should still work."""
 
-        from external_dns_technitium_webhook import main as main_mod
-
-        app = main_mod.create_app()
+        app = main.create_app()
         state = mocker.MagicMock(spec=AppState)
         state.ready = True
         app.state.app_state = state
@@ -2532,7 +1780,6 @@ async def trigger_exception_group():
 
         assert response.status_code == 503
 
-    @pytest.mark.asyncio
     async def test_exception_logging_middleware_handles_exception_group(self, mocker):
         """Middleware should log ExceptionGroup via logger.exception and return 500."""
 
@@ -2541,21 +1788,16 @@ async def trigger_exception_group():
 
         request = MagicMock(spec=Request)
 
-        from external_dns_technitium_webhook import main as main_mod
+        log_exc = mocker.patch.object(main.logger, "exception")
 
-        log_exc = mocker.patch.object(main_mod.logger, "exception")
-
-        response = await main_mod.exception_logging_middleware(request, call_next_error)
+        response = await main.exception_logging_middleware(request, call_next_error)
 
         assert response.status_code == 500
         assert log_exc.called
 
     def test_general_exception_handler_is_used(self, mocker):
         """An unhandled Exception should be processed by general_exception_handler."""
-        from external_dns_technitium_webhook import main as main_mod
-
-        mocker.patch("external_dns_technitium_webhook.main.AppConfig", return_value=_build_config())
-        app = main_mod.create_app()
+        app = main.create_app()
 
         @app.get("/raise-exc")
         async def _raise():
@@ -2566,10 +1808,8 @@ async def trigger_exception_group():
         assert response.status_code == 500
         assert response.json().get("error") == "Internal server error"
 
-    @pytest.mark.asyncio
     async def test_exception_logging_middleware_success_path(self, mocker):
         """When call_next returns normally, middleware should return that response."""
-        from external_dns_technitium_webhook import main as main_mod
 
         class DummyResponse:
             status_code = 204
@@ -2578,24 +1818,21 @@ async def trigger_exception_group():
             return DummyResponse()
 
         request = MagicMock(spec=Request)
-        resp = await main_mod.exception_logging_middleware(request, call_next)
+        resp = await main.exception_logging_middleware(request, call_next)
         assert resp.status_code == 204
 
-    @pytest.mark.asyncio
     async def test_exception_logging_middleware_instancecheck_error(self, mocker):
         """If isinstance(e, ExceptionGroup) raises, middleware should handle it and return 500."""
-        from external_dns_technitium_webhook import main as main_mod
-
         # Temporarily set _ExceptionGroup to an invalid value to cause isinstance() to raise
-        mocker.patch.object(main_mod, "_ExceptionGroup", new=123)
+        mocker.patch.object(main, "_ExceptionGroup", new=123)
 
         async def call_next_error(_request):
             raise ValueError("boom")
 
         request = MagicMock(spec=Request)
-        log_err = mocker.patch.object(main_mod.logger, "error")
+        log_err = mocker.patch.object(main.logger, "error")
 
-        resp = await main_mod.exception_logging_middleware(request, call_next_error)
+        resp = await main.exception_logging_middleware(request, call_next_error)
 
         assert resp.status_code == 500
         assert log_err.called
@@ -2629,15 +1866,3 @@ async def trigger_exception_group():
 
         mock_health.assert_called_once()
         mock_run.assert_called_once()
-
-    @pytest.mark.asyncio
-    async def test_coverage_import_skipped_gracefully(self):
-        """Test coverage import failure is handled gracefully."""
-        # This is tested implicitly during module import
-        # If coverage import fails, the except block handles it
-        # We can't easily test this since it runs at module import time
-        # But we verify the pattern exists in the code
-        import sys
-
-        # Module should be importable even if coverage fails
-        assert "external_dns_technitium_webhook.main" in sys.modules
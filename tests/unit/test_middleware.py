@@ -1,7 +1,8 @@
 """Unit tests for middleware."""
 
 import asyncio
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from datetime import datetime, timedelta
 from unittest.mock import AsyncMock
 
 import pytest
@@ -16,13 +17,13 @@ from external_dns_technitium_webhook.middleware import (
 )
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def rate_limiter() -> RateLimiter:
-    """Create rate limiter for testing."""
+    """Rate limiter shared by this module's tests; each test uses its own client id."""
     return RateLimiter(requests_per_minute=60, burst=10)
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def app_with_middleware() -> FastAPI:
     """Create FastAPI app with middleware for testing."""
     app = FastAPI()
@@ -42,37 +43,66 @@ def app_with_middleware() -> FastAPI:
     return app
 
 
-@pytest.mark.asyncio
-async def test_rate_limiter_init(rate_limiter: RateLimiter) -> None:
+@pytest.fixture(scope="module")
+def client(app_with_middleware: FastAPI) -> Iterator[TestClient]:
+    """One TestClient for checks against ``app_with_middleware`` that leave no state behind."""
+    with TestClient(app_with_middleware) as test_client:
+        yield test_client
+
+
+async def test_rate_limiter_init() -> None:
     """Test rate limiter initialization."""
+    rate_limiter = RateLimiter(requests_per_minute=60, burst=10)
+
     assert rate_limiter.rate == 1.0  # 60 requests/minute = 1/second
     assert rate_limiter.burst == 10.0
     assert len(rate_limiter.tokens) == 0
     assert len(rate_limiter.last_update) == 0
 
 
-@pytest.mark.asyncio
 async def test_rate_limiter_allows_first_request(rate_limiter: RateLimiter) -> None:
     """Test rate limiter allows first request."""
-    result = await rate_limiter.check_rate_limit("client1")
+    result = await rate_limiter.check_rate_limit("first_client")
     assert result is True
 
 
-@pytest.mark.asyncio
-async def test_rate_limiter_burst_capacity(rate_limiter: RateLimiter) -> None:
-    """Test rate limiter burst capacity."""
-    # Burst of 10 requests should all succeed
-    client_id = "burst_client"
-    for i in range(10):
-        result = await rate_limiter.check_rate_limit(client_id)
-        assert result is True, f"Request {i + 1} should succeed"
+@pytest.mark.parametrize(
+    ("client_id", "warmup_client", "warmup_calls", "idle_seconds"),
+    [
+        ("burst_client", "burst_client", 0, 0),
+        ("client2", "client1", 10, 0),
+        ("max_burst_client", "max_burst_client", 5, 3600),
+    ],
+    ids=["burst-capacity", "different-clients", "refill-capped-at-burst"],
+)
+async def test_rate_limiter_allows_burst_then_denies(
+    rate_limiter: RateLimiter,
+    client_id: str,
+    warmup_client: str,
+    warmup_calls: int,
+    idle_seconds: int,
+) -> None:
+    """A client gets exactly ``burst`` requests before it is limited.
+
+    Covers a fresh bucket, a bucket untouched by another client's depletion,
+    and a partly used bucket that refills for an hour but never beyond burst.
+    """
+    for _ in range(warmup_calls):
+        await rate_limiter.check_rate_limit(warmup_client)
+    if warmup_client != client_id:
+        # The other client's bucket is spent, which must not affect ``client_id``
+        assert not await rate_limiter.check_rate_limit(warmup_client)
+    if idle_seconds:
+        rate_limiter.last_update[client_id] = datetime.now() - timedelta(seconds=idle_seconds)
+
+    # The limiter's lock serializes these, so all 10 burst tokens are consumed in one batch
+    results = await asyncio.gather(*(rate_limiter.check_rate_limit(client_id) for _ in range(10)))
+    assert all(results)
 
     # 11th request should fail (exceeded burst)
-    result = await rate_limiter.check_rate_limit(client_id)
-    assert result is False
+    assert await rate_limiter.check_rate_limit(client_id) is False
 
 
-@pytest.mark.asyncio
 async def test_rate_limiter_token_refill(rate_limiter: RateLimiter) -> None:
     """Test that tokens refill over time."""
     client_id = "refill_client"
@@ -85,32 +115,16 @@ async def test_rate_limiter_token_refill(rate_limiter: RateLimiter) -> None:
     result = await rate_limiter.check_rate_limit(client_id)
     assert result is False
 
-    # Wait for 2 seconds to refill tokens (rate = 1 token/second)
-    await asyncio.sleep(2.1)
+    # Pretend the last update was 3 seconds ago to refill tokens (rate = 1 token/second)
+    rate_limiter.last_update[client_id] = datetime.now() - timedelta(seconds=3)
 
     # Should now allow requests again
     result = await rate_limiter.check_rate_limit(client_id)
     assert result is True
 
 
-@pytest.mark.asyncio
-async def test_rate_limiter_different_clients(rate_limiter: RateLimiter) -> None:
-    """Test rate limiter tracks clients separately."""
-    # Client 1 uses up burst
-    for _ in range(10):
-        await rate_limiter.check_rate_limit("client1")
-
-    # Client 1 should be rate limited
-    assert await rate_limiter.check_rate_limit("client1") is False
-
-    # Client 2 should still have full capacity
-    assert await rate_limiter.check_rate_limit("client2") is True
-
-
-def test_rate_limit_middleware_allows_normal_requests(app_with_middleware: FastAPI) -> None:
+def test_rate_limit_middleware_allows_normal_requests(client: TestClient) -> None:
     """Test rate limit middleware allows normal requests."""
-    client = TestClient(app_with_middleware)
-
     # First request should succeed
     response = client.get("/test")
     assert response.status_code == 200
@@ -139,81 +153,62 @@ def test_rate_limit_middleware_blocks_excessive_requests() -> None:
         return await call_next(request)
 
     app.middleware("http")(local_rate_limit_middleware)
-    client = TestClient(app)
 
-    # Make 10 requests (burst limit) - all should succeed
-    for i in range(10):
-        response = client.get("/test")
-        assert response.status_code == 200, f"Request {i + 1} should succeed"
+    with TestClient(app) as client:
+        # Make 10 requests (burst limit) - all should succeed
+        for i in range(10):
+            response = client.get("/test")
+            assert response.status_code == 200, f"Request {i + 1} should succeed"
 
-    # 11th request should be rate limited - use pytest.raises since TestClient re-raises the exception
-    with pytest.raises(HTTPException) as exc_info:
-        client.get("/test")
+        # 11th request should be rate limited - use pytest.raises since TestClient re-raises the exception
+        with pytest.raises(HTTPException) as exc_info:
+            client.get("/test")
 
     assert exc_info.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
 
 
-def test_request_size_limit_allows_small_requests() -> None:
-    """Test request size limit allows small requests."""
-    # Create fresh app for this test to avoid shared state
+def _size_limit_client(max_size: int) -> TestClient:
+    """TestClient for an app behind RequestSizeLimitMiddleware only."""
     app = FastAPI()
 
     @app.post("/test")
     async def test_post(data: dict[str, str]) -> dict[str, str]:
         return {"received": data.get("message", "")}
 
-    # Add only size limit middleware
-    app.add_middleware(RequestSizeLimitMiddleware, max_size=1024)
-
-    client = TestClient(app)
-
-    # Small payload should succeed
-    response = client.post("/test", json={"message": "hello"})
-    assert response.status_code == 200
-    assert response.json() == {"received": "hello"}
-
-
-def test_request_size_limit_blocks_large_requests() -> None:
-    """Test request size limit blocks large requests."""
-    # Create fresh app for this test
-    app = FastAPI()
-
-    @app.post("/test")
-    async def test_post(data: dict[str, str]) -> dict[str, str]:
-        return {"received": data.get("message", "")}
+    app.add_middleware(RequestSizeLimitMiddleware, max_size=max_size)
+    return TestClient(app)
 
-    # Add only size limit middleware with small limit
-    app.add_middleware(RequestSizeLimitMiddleware, max_size=10)
 
-    client = TestClient(app)
+_SIZE_LIMIT_BODY = b'{"message": "hello"}'
 
-    # Create payload larger than 1KB limit
-    large_message = "x" * 2000
-    response = client.post(
-        "/test",
-        json={"message": large_message},
-        headers={"Content-Length": str(len(large_message) + 100)},
-    )
-    assert response.status_code == 413  # HTTP 413 Content Too Large
 
+@pytest.mark.parametrize(
+    ("max_size", "streamed", "expected_status"),
+    [
+        (1024, False, 200),
+        (10, False, 413),
+        (1024, True, 200),
+        (len(_SIZE_LIMIT_BODY), False, 200),
+    ],
+    ids=["small-request", "too-large", "no-content-length", "exact-boundary"],
+)
+def test_request_size_limit(max_size: int, streamed: bool, expected_status: int) -> None:
+    """Requests up to max_size pass, larger ones get 413 (HTTP 413 Content Too Large).
 
-def test_request_size_limit_no_content_length() -> None:
-    """Test request size limit when no Content-Length header."""
-    app = FastAPI()
-
-    @app.post("/test")
-    async def test_endpoint() -> dict[str, str]:
-        return {"status": "ok"}
+    A streamed body is sent chunked, without a Content-Length header.
+    """
+    content = iter([_SIZE_LIMIT_BODY]) if streamed else _SIZE_LIMIT_BODY
 
-    app.add_middleware(RequestSizeLimitMiddleware, max_size=1024)
-    client = TestClient(app)
+    with _size_limit_client(max_size) as client:
+        response = client.post(
+            "/test", content=content, headers={"Content-Type": "application/json"}
+        )
 
-    # Request without Content-Length should still work
-    response = client.post("/test", json={"data": "test"})
-    assert response.status_code == 200
+    assert response.status_code == expected_status
+    if expected_status == 200:
+        assert response.json() == {"received": "hello"}
 
 
-@pytest.mark.asyncio
 async def test_request_size_limit_middleware_init() -> None:
     """Test request size limit middleware initialization."""
     app = FastAPI()
@@ -222,29 +217,6 @@ async def test_request_size_limit_middleware_init() -> None:
     assert middleware.app == app
 
 
-@pytest.mark.asyncio
-async def test_rate_limiter_max_burst_refill(rate_limiter: RateLimiter) -> None:
-    """Test rate limiter doesn't exceed burst capacity on refill."""
-    client_id = "max_burst_client"
-
-    # Use some tokens
-    for _ in range(5):
-        await rate_limiter.check_rate_limit(client_id)
-
-    # Wait longer than needed to refill
-    await asyncio.sleep(20)  # Way more than needed
-
-    # Should have max burst tokens, not unlimited
-    for i in range(10):
-        result = await rate_limiter.check_rate_limit(client_id)
-        assert result is True, f"Request {i + 1} should succeed"
-
-    # 11th should fail (capped at burst)
-    result = await rate_limiter.check_rate_limit(client_id)
-    assert result is False
-
-
-@pytest.mark.asyncio
 async def test_rate_limit_middleware_returns_429_when_limited(
     mocker: MockerFixture,
 ) -> None:
@@ -274,7 +246,6 @@ async def test_rate_limit_middleware_returns_429_when_limited(
     assert exc_info.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
 
 
-@pytest.mark.asyncio
 async def test_request_size_limit_invalid_content_length() -> None:
     """Invalid content-length headers should be treated as oversized requests."""
 
@@ -308,7 +279,6 @@ def test_set_rate_limiter_replaces_global() -> None:
     assert middleware_mod.rate_limiter is rl
 
 
-@pytest.mark.asyncio
 async def test_rate_limit_middleware_with_no_client(mocker) -> None:
     """Rate limit middleware should work when client info is missing."""
     # Patch the global rate_limiter to allow requests
@@ -333,7 +303,6 @@ async def test_rate_limit_middleware_with_no_client(mocker) -> None:
     assert resp.status_code == 200
 
 
-@pytest.mark.asyncio
 async def test_request_size_limit_dispatch_value_error() -> None:
     app = FastAPI()
     mw = RequestSizeLimitMiddleware(app, max_size=10)
@@ -354,7 +323,6 @@ async def test_request_size_limit_dispatch_value_error() -> None:
     assert response.status_code == 413
 
 
-@pytest.mark.asyncio
 async def test_rate_limiter_logs_warning_when_exceeded(mocker) -> None:
     """Ensure a warning is logged when a client is rate limited."""
     from external_dns_technitium_webhook import middleware as middleware_mod
@@ -362,8 +330,6 @@ async def test_rate_limiter_logs_warning_when_exceeded(mocker) -> None:
     rl = middleware_mod.RateLimiter(requests_per_minute=60, burst=1)
     # Force tokens to zero and last_update to now (no refill)
     rl.tokens["badclient"] = 0.0
-    from datetime import datetime
-
     rl.last_update["badclient"] = datetime.now()
 
     mock_warn = mocker.patch("external_dns_technitium_webhook.middleware.logger.warning")
@@ -373,7 +339,6 @@ async def test_rate_limiter_logs_warning_when_exceeded(mocker) -> None:
     mock_warn.assert_called()
 
 
-@pytest.mark.asyncio
 async def test_rate_limit_middleware_retry_after_header(mocker) -> None:
     """Rate limit middleware should include Retry-After header on 429."""
     scope = {
@@ -402,42 +367,52 @@ async def test_rate_limit_middleware_retry_after_header(mocker) -> None:
     assert exc_info.value.headers.get("Retry-After") == "60"
 
 
-@pytest.mark.asyncio
-async def test_refill_allows_requests_without_sleep() -> None:
-    """Simulate time passing by adjusting last_update so tokens refill deterministically."""
-    from datetime import datetime, timedelta
+class _FakeClock:
+    """Injectable ``now_fn`` for RateLimiter that only moves when advanced."""
+
+    def __init__(self) -> None:
+        self.now = datetime(2025, 1, 1)
+
+    def __call__(self) -> datetime:
+        return self.now
 
-    rl = RateLimiter(requests_per_minute=60, burst=5)  # rate = 1 token/sec
+    def advance(self, **delta: float) -> None:
+        self.now += timedelta(**delta)
+
+
+async def test_refill_allows_requests_without_sleep() -> None:
+    """Advancing an injected clock refills tokens deterministically."""
+    clock = _FakeClock()
+    rl = RateLimiter(requests_per_minute=60, burst=5, now_fn=clock)  # rate = 1 token/sec
     client_id = "testclient"
 
     # Start with zero tokens
     rl.tokens[client_id] = 0.0
-    # Pretend last update was 3 seconds ago -> should refill 3 tokens
-    rl.last_update[client_id] = datetime.now() - timedelta(seconds=3)
+    rl.last_update[client_id] = clock()
+    # Three seconds pass -> should refill 3 tokens
+    clock.advance(seconds=3)
 
     allowed = await rl.check_rate_limit(client_id)
     assert allowed is True
     # Now tokens should have been reduced by 1
-    assert rl.tokens[client_id] >= 1.0
+    assert rl.tokens[client_id] == 2.0
 
 
-@pytest.mark.asyncio
 async def test_refill_caps_at_burst() -> None:
     """Ensure refill does not exceed burst capacity even if long time passed."""
-    from datetime import datetime, timedelta
-
-    rl = RateLimiter(requests_per_minute=1, burst=3)  # slow rate but small burst
+    clock = _FakeClock()
+    rl = RateLimiter(requests_per_minute=1, burst=3, now_fn=clock)  # slow rate but small burst
     client_id = "capclient"
 
     # Deplete tokens
     rl.tokens[client_id] = 0.0
-    # Pretend last update was far in the past
-    rl.last_update[client_id] = datetime.now() - timedelta(hours=10)
+    rl.last_update[client_id] = clock()
+    clock.advance(hours=10)
 
     # First check should succeed and refill up to burst then consume 1
     assert await rl.check_rate_limit(client_id) is True
-    # Should not exceed burst (after consuming one, remaining <= burst-1)
-    assert rl.tokens[client_id] <= float(rl.burst - 1)
+    # Should not exceed burst (after consuming one, remaining == burst-1)
+    assert rl.tokens[client_id] == rl.burst - 1
 
 
 def test_configure_rate_limiter_sets_global() -> None:
@@ -453,7 +428,6 @@ def test_configure_rate_limiter_sets_global() -> None:
     assert rl.rate == 2.0
 
 
-@pytest.mark.asyncio
 async def test_rate_limiter_concurrent_consumption() -> None:
     """Verify concurrent checks consume tokens atomically under the lock."""
     rl = RateLimiter(requests_per_minute=60, burst=2)
@@ -468,28 +442,7 @@ async def test_rate_limiter_concurrent_consumption() -> None:
     assert rl.tokens[client_id] < 1.0
 
 
-def test_request_size_limit_exact_boundary() -> None:
-    """Content-Length equal to max_size should be allowed (not blocked)."""
-    app = FastAPI()
-
-    @app.post("/test")
-    async def test_post(data: dict[str, str]) -> dict[str, str]:
-        return {"received": data.get("message", "")}
-
-    max_size = 50
-    app.add_middleware(RequestSizeLimitMiddleware, max_size=max_size)
-    client = TestClient(app)
-
-    payload = "x" * max_size
-    response = client.post(
-        "/test",
-        json={"message": payload},
-        headers={"Content-Length": str(len(payload))},
-    )
-    assert response.status_code == 200
-
-
-@pytest.fixture
+@pytest.fixture(scope="module")
 def app_with_gzip_middleware() -> FastAPI:
     """Create FastAPI app with GZipMiddleware for testing."""
     from fastapi.middleware.gzip import GZipMiddleware
@@ -517,11 +470,16 @@ def app_with_gzip_middleware() -> FastAPI:
     return app
 
 
-def test_gzip_middleware_large_response_compressed(app_with_gzip_middleware: FastAPI) -> None:
-    """Test that GZipMiddleware compresses responses larger than minimum_size."""
-    client = TestClient(app_with_gzip_middleware)
+@pytest.fixture(scope="module")
+def gzip_client(app_with_gzip_middleware: FastAPI) -> Iterator[TestClient]:
+    """One TestClient shared by the GZipMiddleware tests."""
+    with TestClient(app_with_gzip_middleware) as client:
+        yield client
 
-    response = client.get("/large")
+
+def test_gzip_middleware_large_response_compressed(gzip_client: TestClient) -> None:
+    """Test that GZipMiddleware compresses responses larger than minimum_size."""
+    response = gzip_client.get("/large")
 
     assert response.status_code == 200
     assert "Content-Encoding" in response.headers
@@ -533,11 +491,9 @@ def test_gzip_middleware_large_response_compressed(app_with_gzip_middleware: Fas
     assert len(data["message"]) == 1500
 
 
-def test_gzip_middleware_small_response_not_compressed(app_with_gzip_middleware: FastAPI) -> None:
+def test_gzip_middleware_small_response_not_compressed(gzip_client: TestClient) -> None:
     """Test that GZipMiddleware does not compress responses smaller than minimum_size."""
-    client = TestClient(app_with_gzip_middleware)
-
-    response = client.get("/small")
+    response = gzip_client.get("/small")
 
     assert response.status_code == 200
     assert "Content-Encoding" not in response.headers
@@ -546,11 +502,9 @@ def test_gzip_middleware_small_response_not_compressed(app_with_gzip_middleware:
     assert data == {"message": "small"}
 
 
-def test_gzip_middleware_exact_size_compressed(app_with_gzip_middleware: FastAPI) -> None:
+def test_gzip_middleware_exact_size_compressed(gzip_client: TestClient) -> None:
     """Test that GZipMiddleware compresses responses at or above minimum_size."""
-    client = TestClient(app_with_gzip_middleware)
-
-    response = client.get("/exact")
+    response = gzip_client.get("/exact")
 
     assert response.status_code == 200
     # Responses at minimum_size are compressed (>= minimum_size)
@@ -1,20 +1,40 @@
-"""Tests for server logic (run_servers, threading, entrypoint)."""
+"""Tests for server logic (run_servers, run_health_server)."""
 
+import asyncio
+import re
 import signal
 import sys
 import types
-from unittest.mock import MagicMock
+from unittest.mock import ANY, DEFAULT, Mock, call
 
 import pytest
-from fastapi import FastAPI
 
 import external_dns_technitium_webhook.server as server_mod
 from external_dns_technitium_webhook.config import Config as AppConfig
 
+# Fixed messages are matched exactly with assert_any_call; the patterns cover
+# messages that embed exception text or signal numbers.
+_HEALTH_READY_MSG = "Health server is ready"
+_HEALTH_TIMEOUT_MSG = "Health server failed to start (timeout waiting for server to bind to port)"
 
-@pytest.fixture
+_HEALTH_RE = re.compile(r"^\[HEALTH\]")
+_HEALTH_TIMEOUT_RE = re.compile(rf"^{re.escape(_HEALTH_TIMEOUT_MSG)}$")
+_HEALTH_SERVE_ERR_RE = re.compile(r"Health server serve error: ")
+_HEALTH_ERR_RE = re.compile(r"Health server error: ")
+_HEALTH_SHUTDOWN_RE = re.compile(r"Health server received shutdown signal")
+_HEALTH_STOP_TIMEOUT_RE = re.compile(r"^Health server did not stop within ")
+_MAIN_ERR_RE = re.compile(r"^Main server error: ")
+_SIGNAL_RE = re.compile(r"^Received signal ")
+
+
+def _logged(log_mock, pattern: re.Pattern[str]) -> bool:
+    """Whether any message passed to the patched logging function matches ``pattern``."""
+    return any(pattern.search(c.args[0]) for c in log_mock.call_args_list if c.args)
+
+
+@pytest.fixture(scope="session")
 def config():
-    """Provide a test configuration."""
+    """Provide a test configuration; shared because no test mutates it."""
     return AppConfig(
         technitium_url="http://localhost:5380",
         technitium_username="admin",
@@ -24,450 +44,227 @@ def config():
     )
 
 
-def test_run_servers_starts_both_servers(mocker, config):
-    """Test that run_servers starts both main and health servers."""
-    app = FastAPI()
-    health_app = FastAPI()
-    mock_server = mocker.patch("external_dns_technitium_webhook.server.Server")
-    mock_server.return_value.serve = mocker.Mock()
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-    mock_thread = mocker.patch("external_dns_technitium_webhook.server.threading.Thread")
-    mock_asyncio_run = mocker.patch("external_dns_technitium_webhook.server.asyncio.run")
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal")
-    mock_event = mocker.patch("external_dns_technitium_webhook.server.threading.Event")
-    mock_event.return_value.wait.return_value = True
-
-    server_mod.run_servers(app, health_app, config)
-
-    # Verify health thread was started
-    mock_thread.return_value.start.assert_called_once()
-    # Verify main server was started
-    mock_asyncio_run.assert_called_once()
-
-
-def test_run_servers_signal_handler(mocker, config):
-    """Test that signal handler sets shutdown event and server flags."""
-    app = FastAPI()
-    health_app = FastAPI()
-    mock_server = mocker.patch("external_dns_technitium_webhook.server.Server")
-    # Use Mock instead of AsyncMock to avoid un-awaited coroutine when signal handler is called
-    mock_server.return_value.serve = mocker.Mock()
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-    mocker.patch("external_dns_technitium_webhook.server.threading.Thread")
-    mocker.patch("external_dns_technitium_webhook.server.asyncio.run")
-    mock_signal = mocker.patch("external_dns_technitium_webhook.server.signal.signal")
-    mock_event = mocker.patch("external_dns_technitium_webhook.server.threading.Event")
-    mock_event.return_value.wait.return_value = True
-    mock_logging = mocker.patch("external_dns_technitium_webhook.server.logging.info")
-
-    server_mod.run_servers(app, health_app, config)
-
-    # Get the signal handler from the mock calls
-    signal_handler = mock_signal.call_args_list[0][0][1]
-
-    # Call the signal handler
-    signal_handler(15, None)
-
-    # Verify logging was called
-    assert any("Received signal" in str(call) for call in mock_logging.call_args_list)
-
-
-def test_run_servers_health_thread_exception(mocker, config):
-    """Test that health server exceptions are logged in health thread."""
-    app = FastAPI()
-    health_app = FastAPI()
-    mock_server = mocker.patch("external_dns_technitium_webhook.server.Server")
-
-    # Create a mock that will be used in the health thread
-    mock_health_serve = mocker.AsyncMock(side_effect=Exception("Health server error"))
-
-    # Track which server instance is created (main vs health)
-    server_instances = []
-
-    def create_server(config):
-        instance = mocker.Mock()
-        if len(server_instances) == 0:
-            # First call is main server
-            instance.serve = mocker.Mock()
-        else:
-            # Second call is health server
-            instance.serve = mock_health_serve
-        server_instances.append(instance)
-        return instance
-
-    mock_server.side_effect = create_server
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-
-    # Capture the thread target function
-    thread_target = None
-
-    def capture_thread(*args, **kwargs):
-        nonlocal thread_target
-        thread_target = kwargs.get("target")
-        mock_thread = mocker.Mock()
-        mock_thread.start = mocker.Mock()
-        mock_thread.join = mocker.Mock()
-        return mock_thread
-
-    mocker.patch(
-        "external_dns_technitium_webhook.server.threading.Thread", side_effect=capture_thread
-    )
-    mocker.patch("external_dns_technitium_webhook.server.asyncio.run")
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal")
-    mock_event = mocker.patch("external_dns_technitium_webhook.server.threading.Event")
-    mock_event.return_value.wait.return_value = False
-    mock_logging_error = mocker.patch("external_dns_technitium_webhook.server.logging.error")
-    mock_loop = mocker.Mock()
-    mock_loop.run_until_complete = mocker.Mock(side_effect=Exception("Health server error"))
-    mock_loop.close = mocker.Mock()
-    mocker.patch(
-        "external_dns_technitium_webhook.server.asyncio.new_event_loop", return_value=mock_loop
-    )
-    mocker.patch("external_dns_technitium_webhook.server.asyncio.set_event_loop")
-
-    server_mod.run_servers(app, health_app, config)
-
-    # Verify health server failed to start was logged
-    assert any(
-        "Health server failed to start" in str(call) for call in mock_logging_error.call_args_list
-    )
-
-
-def test_run_servers_main_server_exception(mocker, config):
-    """Test that main server exceptions are logged."""
-    app = FastAPI()
-    health_app = FastAPI()
-    mock_server = mocker.patch("external_dns_technitium_webhook.server.Server")
-    # Don't use AsyncMock - asyncio.run is mocked so the coroutine won't be awaited properly
-    mock_server.return_value.serve = mocker.Mock()
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-    mock_thread = mocker.patch("external_dns_technitium_webhook.server.threading.Thread")
-    mock_asyncio_run = mocker.patch("external_dns_technitium_webhook.server.asyncio.run")
-    mock_asyncio_run.side_effect = Exception("Main server error")
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal")
-    mock_event = mocker.patch("external_dns_technitium_webhook.server.threading.Event")
-    mock_event.return_value.wait.return_value = True
-    mock_logging_error = mocker.patch("external_dns_technitium_webhook.server.logging.error")
-
-    server_mod.run_servers(app, health_app, config)
-
-    # Verify error was logged
-    mock_logging_error.assert_called_once()
-    assert "Main server error" in str(mock_logging_error.call_args)
-    # Verify thread join was called in finally block
-    mock_thread.return_value.join.assert_called_once_with(timeout=5)
-
-
-def test_run_health_server_success(mocker, config):
-    """Test that run_health_server starts successfully."""
-    health_app = FastAPI()
-    mock_server = mocker.patch("external_dns_technitium_webhook.server.Server")
-    # Don't use AsyncMock when mocking run_until_complete - use Mock to avoid creating un-awaited coroutines
-    mock_server.return_value.serve = mocker.Mock()
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-    mock_loop = mocker.Mock()
-    mock_loop.run_until_complete = mocker.Mock()
-    mock_loop.close = mocker.Mock()
-    mocker.patch(
-        "external_dns_technitium_webhook.server.asyncio.new_event_loop", return_value=mock_loop
-    )
-    mocker.patch("external_dns_technitium_webhook.server.asyncio.set_event_loop")
-    mock_logging = mocker.patch("external_dns_technitium_webhook.server.logging.info")
-
-    server_mod.run_health_server(health_app, config)
-
-    # Verify loop was created and used
-    mock_loop.run_until_complete.assert_called_once()
-    mock_loop.close.assert_called_once()
-    # Verify logging was called
-    assert any("[HEALTH]" in str(call) for call in mock_logging.call_args_list)
-
-
-def test_run_health_server_exception_in_serve(mocker, config):
-    """Test that run_health_server handles exceptions from serve()."""
-    health_app = FastAPI()
-    mock_server = mocker.patch("external_dns_technitium_webhook.server.Server")
-    # Don't use AsyncMock when mocking run_until_complete - use Mock to avoid creating un-awaited coroutines
-    mock_server.return_value.serve = mocker.Mock()
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-    mock_loop = mocker.Mock()
-    # Simulate serve() raising an exception when run in the loop
-    mock_loop.run_until_complete = mocker.Mock(side_effect=Exception("Serve failed"))
-    mock_loop.close = mocker.Mock()
-    mocker.patch(
-        "external_dns_technitium_webhook.server.asyncio.new_event_loop", return_value=mock_loop
-    )
-    mocker.patch("external_dns_technitium_webhook.server.asyncio.set_event_loop")
-    mock_logging_error = mocker.patch("external_dns_technitium_webhook.server.logging.error")
-
-    server_mod.run_health_server(health_app, config)
-
-    # Verify error was logged
-    assert any(
-        "Health server serve error" in str(call) for call in mock_logging_error.call_args_list
-    )
-    mock_loop.close.assert_called_once()
-
+@pytest.fixture
+def app():
+    """Stand-in main app; run_servers only sets a flag on its ``state``."""
+    return types.SimpleNamespace(state=types.SimpleNamespace())
 
-def test_run_health_server_outer_exception(mocker, config):
-    """Test that run_health_server handles outer exceptions."""
-    health_app = FastAPI()
-    mocker.patch("external_dns_technitium_webhook.server.Server")
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-    mock_new_event_loop = mocker.patch(
-        "external_dns_technitium_webhook.server.asyncio.new_event_loop"
-    )
-    mock_new_event_loop.side_effect = Exception("Loop creation failed")
-    mock_logging_error = mocker.patch("external_dns_technitium_webhook.server.logging.error")
 
-    server_mod.run_health_server(health_app, config)
+@pytest.fixture(scope="session")
+def health_app():
+    """Stand-in health app; the fake servers only ever hold it by identity."""
+    return object()
 
-    # Verify outer error was logged
-    assert any("Health server error" in str(call) for call in mock_logging_error.call_args_list)
 
+class _FakeServer:
+    """Stand-in for ``uvicorn.Server`` whose ``serve()`` returns at once or raises.
 
-def test_run_health_server_system_exit_in_serve(mocker, config):
-    """Test that run_health_server logs and propagates a SystemExit raised by
-    the server implementation.
+    With ``bind=False`` it never reports ``started`` and instead idles until
+    told to exit, like a server stuck before binding its port.
+    """
 
-    We avoid letting the real ``uvicorn.Server`` try to bind a port by
-    configuring the patched ``Server`` class to raise the exception when
-    ``serve()`` is called.  The function is expected to log the shutdown
-    message at INFO level and then re-raise the error, so the test uses
-    ``pytest.raises`` to catch the propagated ``SystemExit``.
+    def __init__(self, cfg, error: BaseException | None = None, bind: bool = True):
+        self.config = cfg
+        self.error = error
+        self.bind = bind
+        self.started = False
+        self.should_exit = False
+        self.serve_calls = 0
+
+    async def serve(self):
+        self.serve_calls += 1
+        if self.error is not None:
+            raise self.error
+        if not self.bind:
+            while not self.should_exit:
+                await asyncio.sleep(0)
+            return
+        self.started = True
+        await asyncio.sleep(0)
+
+
+def _drive(coro, loop_factory=None):
+    """Run ``coro`` on a private loop; conftest stubs out ``asyncio.run`` itself."""
+    loop = (loop_factory or asyncio.new_event_loop)()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+@pytest.fixture(autouse=True)
+def server_mocks(mocker, config):
+    """Patch the server module once per test and expose the patches.
+
+    ``Server`` builds a ``_FakeServer`` per port; set ``main_error``,
+    ``health_error`` or ``health_bind`` before calling into the module to
+    change how they behave; ``health_bind=False`` also zeroes the startup
+    timeout. ``main`` and ``health`` hold the servers built.
     """
-    health_app = FastAPI()
-    mock_server = mocker.patch("external_dns_technitium_webhook.server.Server")
-    # configure serve() to immediately raise; this prevents the real
-    # uvicorn logic from ever executing and binding to a port.
-    mock_server.return_value.serve = mocker.Mock(side_effect=SystemExit(1))
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-
-    mock_loop = mocker.Mock()
-    mock_loop.run_until_complete = mocker.Mock()
-    mock_loop.close = mocker.Mock()
-    mocker.patch(
-        "external_dns_technitium_webhook.server.asyncio.new_event_loop",
-        return_value=mock_loop,
+    ns = types.SimpleNamespace(
+        main=None, health=None, main_error=None, health_error=None, health_bind=True
     )
-    mocker.patch("external_dns_technitium_webhook.server.asyncio.set_event_loop")
-    mock_logging_info = mocker.patch("external_dns_technitium_webhook.server.logging.info")
 
-    with pytest.raises(SystemExit):
-        server_mod.run_health_server(health_app, config)
-
-    # Verify SystemExit was handled and logged at INFO level
-    assert any(
-        "Health server received shutdown signal" in str(call)
-        for call in mock_logging_info.call_args_list
+    def server_factory(cfg):
+        if cfg.port == config.health_port:
+            if not ns.health_bind:
+                # A health server that never binds: give up at the first
+                # readiness check rather than waiting in real time
+                mocker.patch.object(server_mod, "HEALTH_STARTUP_TIMEOUT", 0.0)
+            ns.health = _FakeServer(cfg, ns.health_error, ns.health_bind)
+            return ns.health
+        ns.main = _FakeServer(cfg, ns.main_error)
+        return ns.main
+
+    # Plain Mock for Server (the module placeholder is None, so there is no
+    # spec to copy); autospec keeps the function doubles signature-checked.
+    # asyncio.run is specced from asyncio.runners.run because conftest has
+    # already swapped asyncio.run for a permissive lambda.
+    ns.Server = mocker.patch(
+        "external_dns_technitium_webhook.server.Server",
+        new_callable=Mock,
+        side_effect=server_factory,
     )
-    mock_loop.close.assert_called_once()
-
-
-# Additional comprehensive tests for run_servers function
-
-
-def test_run_servers_happy_path(mocker, config):
-    """Test the happy path where both servers start and run successfully."""
-    app = FastAPI()
-    health_app = FastAPI()
-
-    mock_health_server = MagicMock()
-    mock_main_server = MagicMock()
-
-    def server_factory(config_obj):
-        if config_obj.port == config.health_port:
-            return mock_health_server
-        return mock_main_server
-
-    mocker.patch("external_dns_technitium_webhook.server.Server", side_effect=server_factory)
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-
-    mock_thread = MagicMock()
-    mocker.patch(
-        "external_dns_technitium_webhook.server.threading.Thread", return_value=mock_thread
+    ns.asyncio_run = mocker.patch(
+        "external_dns_technitium_webhook.server.asyncio.run",
+        autospec=asyncio.runners.run,
+        side_effect=_drive,
     )
-
-    mock_event = MagicMock()
-    mock_event.wait.return_value = False
-    mocker.patch("external_dns_technitium_webhook.server.threading.Event", return_value=mock_event)
-
-    mock_asyncio_run = mocker.patch("external_dns_technitium_webhook.server.asyncio.run")
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal")
-
-    server_mod.run_servers(app, health_app, config)
-
-    mock_thread.start.assert_called_once()
-    mock_asyncio_run.assert_called_once()
-    mock_thread.join.assert_called_once()
-
-
-def test_run_servers_signal_handlers(mocker, config):
-    """Test that signal handlers are registered correctly."""
-    app = FastAPI()
-    health_app = FastAPI()
-
-    mock_health_server = MagicMock()
-    mock_main_server = MagicMock()
-
-    def server_factory(config_obj):
-        if config_obj.port == config.health_port:
-            return mock_health_server
-        return mock_main_server
-
-    mocker.patch("external_dns_technitium_webhook.server.Server", side_effect=server_factory)
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-
-    mock_thread = MagicMock()
-    mocker.patch(
-        "external_dns_technitium_webhook.server.threading.Thread", return_value=mock_thread
+    ns.signal = mocker.patch("external_dns_technitium_webhook.server.signal.signal", autospec=True)
+    logs = mocker.patch.multiple(
+        "external_dns_technitium_webhook.server.logging",
+        info=DEFAULT,
+        error=DEFAULT,
+        autospec=True,
     )
+    ns.log_info, ns.log_error = logs["info"], logs["error"]
+    return ns
 
-    mock_event = MagicMock()
-    mock_event.wait.return_value = False
-    mocker.patch("external_dns_technitium_webhook.server.threading.Event", return_value=mock_event)
-
-    mocker.patch("external_dns_technitium_webhook.server.asyncio.run")
-    mock_signal = mocker.patch("external_dns_technitium_webhook.server.signal.signal")
 
+def test_run_servers_happy_path(server_mocks, app, health_app, config):
+    """Both servers are served once from a single asyncio.run call."""
     server_mod.run_servers(app, health_app, config)
 
-    assert mock_signal.call_count >= 2
-    signal_calls = [call[0][0] for call in mock_signal.call_args_list]
-    assert signal.SIGTERM in signal_calls
-    assert signal.SIGINT in signal_calls
-
-
-def test_run_servers_health_server_timeout(mocker, config):
-    """Test health server timeout during startup (wait returns False = timeout)."""
-    app = FastAPI()
-    health_app = FastAPI()
-
-    mock_health_server = MagicMock()
-    mock_main_server = MagicMock()
-
-    def server_factory(config_obj):
-        if config_obj.port == config.health_port:
-            return mock_health_server
-        return mock_main_server
-
-    mocker.patch("external_dns_technitium_webhook.server.Server", side_effect=server_factory)
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-
-    mock_thread = MagicMock()
-    mocker.patch(
-        "external_dns_technitium_webhook.server.threading.Thread", return_value=mock_thread
-    )
-
-    mock_event = MagicMock()
-    # wait() returns False on timeout
-    mock_event.wait.return_value = False
-    mocker.patch("external_dns_technitium_webhook.server.threading.Event", return_value=mock_event)
-
-    mocker.patch("external_dns_technitium_webhook.server.asyncio.run")
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal")
-    mock_logging_error = mocker.patch("external_dns_technitium_webhook.server.logging.error")
+    server_mocks.asyncio_run.assert_called_once()
+    assert server_mocks.main.serve_calls == 1
+    assert server_mocks.health.serve_calls == 1
+    assert server_mocks.main.config.port == config.listen_port
+    assert server_mocks.health.config.port == config.health_port
+    assert server_mocks.main.config.app is app
+    assert server_mocks.health.config.app is health_app
+    # main.lifespan reads this to skip its own health server thread
+    assert app.state.health_served_by_run_servers is True
+
+
+@pytest.mark.parametrize(
+    ("health_bind", "log", "message"),
+    [(True, "log_info", _HEALTH_READY_MSG), (False, "log_error", _HEALTH_TIMEOUT_MSG)],
+    ids=["ready", "timeout"],
+)
+def test_run_servers_health_startup(
+    mocker, server_mocks, app, health_app, config, health_bind, log, message
+):
+    """The main server waits for the health server to bind, or for the timeout."""
+    server_mocks.health_bind = health_bind
+    health_started_at_main_serve: list[bool] = []
+    fake_serve = _FakeServer.serve
+
+    async def tracking_serve(self):
+        if self is server_mocks.main:
+            health_started_at_main_serve.append(server_mocks.health.started)
+        await fake_serve(self)
+
+    mocker.patch.object(_FakeServer, "serve", tracking_serve)
 
     server_mod.run_servers(app, health_app, config)
 
-    # When wait() returns False, an error is logged about timeout
-    assert any(
-        "Health server failed to start (timeout" in str(call)
-        for call in mock_logging_error.call_args_list
-    )
-
-
-def test_run_servers_main_server_exception_with_health_timeout(mocker, config):
-    """Test exception handling during main server execution when health times out."""
-    app = FastAPI()
-    health_app = FastAPI()
+    assert health_started_at_main_serve == [health_bind]
+    getattr(server_mocks, log).assert_any_call(message)
+    # Whether or not the health server came up, it is stopped with the main server
+    assert server_mocks.health.should_exit is True
+
+
+@pytest.mark.parametrize(
+    ("health_bind", "expected_errors"),
+    [
+        (True, [_MAIN_ERR_RE]),
+        (False, [_HEALTH_TIMEOUT_RE, _MAIN_ERR_RE]),
+    ],
+    ids=["health-ready", "health-timeout"],
+)
+def test_run_servers_main_server_exception(
+    server_mocks, app, health_app, config, health_bind, expected_errors
+):
+    """Test that main server exceptions are logged, after any health startup timeout."""
+    server_mocks.main_error = Exception("Main server error")
+    server_mocks.health_bind = health_bind
 
-    mock_health_server = MagicMock()
-    mock_main_server = MagicMock()
+    server_mod.run_servers(app, health_app, config)
 
-    def server_factory(config_obj):
-        if config_obj.port == config.health_port:
-            return mock_health_server
-        return mock_main_server
+    # Verify errors were logged once each, in order
+    errors = server_mocks.log_error.call_args_list
+    assert len(errors) == len(expected_errors)
+    for logged, expected in zip(errors, expected_errors, strict=True):
+        assert expected.search(logged.args[0])
+    # The health server is told to stop once the main server is gone
+    assert server_mocks.health.should_exit is True
 
-    mocker.patch("external_dns_technitium_webhook.server.Server", side_effect=server_factory)
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
 
-    mock_thread = MagicMock()
-    mocker.patch(
-        "external_dns_technitium_webhook.server.threading.Thread", return_value=mock_thread
-    )
+def test_run_servers_cancels_hung_health_server(mocker, server_mocks, app, health_app, config):
+    """A health server that ignores should_exit is cancelled after the shutdown timeout."""
+    mocker.patch.object(server_mod, "HEALTH_SHUTDOWN_TIMEOUT", 0.0)
+    fake_serve = _FakeServer.serve
 
-    mock_event = MagicMock()
-    # wait() returns False on timeout
-    mock_event.wait.return_value = False
-    mocker.patch("external_dns_technitium_webhook.server.threading.Event", return_value=mock_event)
+    async def hanging_serve(self):
+        if self is server_mocks.health:
+            self.started = True
+            await asyncio.Future()  # never resolves; only cancellation ends it
+        await fake_serve(self)
 
-    mock_asyncio_run = mocker.patch("external_dns_technitium_webhook.server.asyncio.run")
-    mock_asyncio_run.side_effect = Exception("Simulated main server error")
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal")
-    mock_logging_error = mocker.patch("external_dns_technitium_webhook.server.logging.error")
+    mocker.patch.object(_FakeServer, "serve", hanging_serve)
 
     server_mod.run_servers(app, health_app, config)
 
-    # Two errors: health timeout + main server error
-    assert len(mock_logging_error.call_args_list) == 2
-    assert "Health server failed to start (timeout" in str(mock_logging_error.call_args_list[0])
-    assert "Simulated main server error" in str(mock_logging_error.call_args_list[1])
-    mock_thread.join.assert_called_once()
-
-
-def test_run_servers_signals_handled(mocker, config):
-    """Test that signals trigger graceful shutdown."""
-    app = FastAPI()
-    health_app = FastAPI()
+    assert server_mocks.main.serve_calls == 1
+    assert _logged(server_mocks.log_error, _HEALTH_STOP_TIMEOUT_RE)
+    assert not _logged(server_mocks.log_error, _MAIN_ERR_RE)
 
-    mock_health_server = MagicMock()
-    mock_main_server = MagicMock()
-
-    def server_factory(config_obj):
-        if config_obj.port == config.health_port:
-            return mock_health_server
-        return mock_main_server
-
-    mocker.patch("external_dns_technitium_webhook.server.Server", side_effect=server_factory)
-    mocker.patch("external_dns_technitium_webhook.server.UvicornConfig")
-
-    mock_thread = MagicMock()
-    mocker.patch(
-        "external_dns_technitium_webhook.server.threading.Thread", return_value=mock_thread
-    )
 
-    mock_event = MagicMock()
-    mock_event.wait.return_value = False
-    mocker.patch("external_dns_technitium_webhook.server.threading.Event", return_value=mock_event)
-
-    mocker.patch("external_dns_technitium_webhook.server.asyncio.run")
+@pytest.mark.parametrize(
+    "health_error", [RuntimeError("serve failed"), SystemExit(1)], ids=["error", "system-exit"]
+)
+def test_run_servers_health_serve_raises_logs_error(
+    server_mocks, app, health_app, config, health_error
+):
+    """When health server serve() raises, the error should be logged but not crash main."""
+    server_mocks.health_error = health_error
 
-    captured_handlers = {}
+    server_mod.run_servers(app, health_app, config)
 
-    def capture_signal(sig, handler):
-        captured_handlers[sig] = handler
+    assert server_mocks.main.serve_calls == 1
+    assert _logged(server_mocks.log_error, _HEALTH_SERVE_ERR_RE)
+    assert not _logged(server_mocks.log_error, _MAIN_ERR_RE)
 
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal", side_effect=capture_signal)
 
+def test_run_servers_signals_handled(server_mocks, app, health_app, config):
+    """SIGTERM and SIGINT handlers are registered, log, and trigger graceful shutdown."""
     server_mod.run_servers(app, health_app, config)
+    server_mocks.main.should_exit = server_mocks.health.should_exit = False
 
-    assert signal.SIGTERM in captured_handlers
-    assert signal.SIGINT in captured_handlers
+    server_mocks.signal.assert_has_calls(
+        [call(signal.SIGTERM, ANY), call(signal.SIGINT, ANY)], any_order=True
+    )
 
-    handler = captured_handlers[signal.SIGTERM]
+    handler = server_mocks.signal.call_args_list[0].args[1]
     handler(signal.SIGTERM, None)
 
-    mock_event.set.assert_called()
-    assert mock_health_server.should_exit is True
-    assert mock_main_server.should_exit is True
+    assert _logged(server_mocks.log_info, _SIGNAL_RE)
+    assert server_mocks.health.should_exit is True
+    assert server_mocks.main.should_exit is True
 
 
-def test_run_servers_with_uvicorn_stub(mocker, config, monkeypatch):
+def test_run_servers_with_uvicorn_stub(server_mocks, app, health_app, config, monkeypatch):
     """Test run_servers when the real `uvicorn` module is importable but patched to a stub."""
-    app = FastAPI()
-    health_app = FastAPI()
 
     # Create a dummy uvicorn module with Config and Server classes
     class DummyConfig:
@@ -475,145 +272,67 @@ def test_run_servers_with_uvicorn_stub(mocker, config, monkeypatch):
             self.args = args
             self.kwargs = kwargs
 
-    class DummyServer:
-        def __init__(self, cfg):
-            self.cfg = cfg
-            self.should_exit = False
+    created: list[_FakeServer] = []
 
-        def serve(self):
-            # Provide a synchronous serve() to avoid creating an awaitable
-            return None
+    def dummy_server(cfg):
+        created.append(_FakeServer(cfg))
+        return created[-1]
 
-    dummy_uvicorn = types.SimpleNamespace(Config=DummyConfig, Server=DummyServer)
+    dummy_uvicorn = types.SimpleNamespace(Config=DummyConfig, Server=dummy_server)
     monkeypatch.setitem(sys.modules, "uvicorn", dummy_uvicorn)
 
     # Ensure module-level Server is None so the function imports UvicornServer
-    server_mod.Server = None
-
-    # Patch thread and events to avoid starting real threads
-    mock_thread = MagicMock()
-    mock_thread.start = MagicMock()
-    mock_thread.join = MagicMock()
-    mocker.patch(
-        "external_dns_technitium_webhook.server.threading.Thread", return_value=mock_thread
-    )
-
-    mock_event = MagicMock()
-    mock_event.wait.return_value = False
-    mocker.patch("external_dns_technitium_webhook.server.threading.Event", return_value=mock_event)
-
-    mock_asyncio_run = mocker.patch("external_dns_technitium_webhook.server.asyncio.run")
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal")
+    monkeypatch.setattr(server_mod, "Server", None)
 
     # Call run_servers which should import our dummy uvicorn and proceed
     server_mod.run_servers(app, health_app, config)
 
-    mock_thread.start.assert_called_once()
-    mock_asyncio_run.assert_called_once()
-    mock_thread.join.assert_called_once()
-
-
-def test_run_servers_real_thread_health_start_and_main_run(mocker, config, monkeypatch):
-    """Use a real thread and dummy async serve() methods to exercise inline health server path."""
-    import warnings
-
-    warnings.filterwarnings(
-        "ignore", message="coroutine '.*' was never awaited", category=RuntimeWarning
-    )
-    app = FastAPI()
-    health_app = FastAPI()
-
-    # Dummy server with async serve that returns quickly
-    class DummyServer:
-        def __init__(self, cfg):
-            self.cfg = cfg
-            self.should_exit = False
-
-        async def serve(self):
-            return None
-
-    # Patch uvicorn.Server to our DummyServer
-    monkeypatch.setitem(
-        sys.modules,
-        "uvicorn",
-        types.SimpleNamespace(Config=lambda *a, **k: None, Server=DummyServer),
-    )
-    # Ensure module-level Server is None so run_servers uses the imported class
-    server_mod.Server = None
-
-    # Patch signal handlers to no-op
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal")
-
-    # Call run_servers — this will start a real thread and run the dummy servers
-    server_mod.run_servers(app, health_app, config)
-
-
-def test_run_servers_health_serve_raises_logs_error(mocker, config, monkeypatch):
-    """When health server serve() raises, the error should be logged but not crash main."""
-    import warnings
-
-    warnings.filterwarnings(
-        "ignore", message="coroutine '.*' was never awaited", category=RuntimeWarning
-    )
-    app = FastAPI()
-    health_app = FastAPI()
-
-    class DummyServerError:
-        def __init__(self, cfg):
-            self.cfg = cfg
-            self.should_exit = False
-
-        async def serve(self):
-            raise RuntimeError("serve failed")
-
-    monkeypatch.setitem(
-        sys.modules,
-        "uvicorn",
-        types.SimpleNamespace(Config=lambda *a, **k: None, Server=DummyServerError),
-    )
-    server_mod.Server = None
-
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal")
-    mock_err = mocker.patch("external_dns_technitium_webhook.server.logging.error")
-
-    server_mod.run_servers(app, health_app, config)
-
-    # Should have logged an error about health server serve failure or related startup error
-    assert any("Health server" in str(c) for c in mock_err.call_args_list)
-
-
-def test_run_servers_health_loop_creation_fails(mocker, config, monkeypatch):
-    """When asyncio.new_event_loop raises inside the health thread, run_servers should log the error."""
-    app = FastAPI()
-    health_app = FastAPI()
+    server_mocks.asyncio_run.assert_called_once()
+    assert [server.serve_calls for server in created] == [1, 1]
+    assert [server.config.kwargs["port"] for server in created] == [
+        config.listen_port,
+        config.health_port,
+    ]
+
+
+@pytest.mark.parametrize(
+    ("health_error", "server_error", "log", "pattern", "run_calls"),
+    [
+        (None, None, "log_info", _HEALTH_RE, 1),
+        (Exception("Serve failed"), None, "log_error", _HEALTH_SERVE_ERR_RE, 1),
+        (None, Exception("Server creation failed"), "log_error", _HEALTH_ERR_RE, 0),
+        (SystemExit(1), None, "log_info", _HEALTH_SHUTDOWN_RE, 1),
+    ],
+    ids=["success", "serve-error", "outer-error", "system-exit"],
+)
+def test_run_health_server(
+    server_mocks, health_app, config, health_error, server_error, log, pattern, run_calls
+):
+    """run_health_server serves once, logs failures, and re-raises shutdown signals.
+
+    A ``SystemExit`` from ``serve()`` is logged at INFO level and propagated;
+    other errors are logged and swallowed so the health thread exits quietly.
+    """
+    server_mocks.health_error = health_error
+    if server_error is not None:
+        server_mocks.Server.side_effect = server_error
+
+    if isinstance(health_error, SystemExit):
+        with pytest.raises(SystemExit):
+            server_mod.run_health_server(health_app, config)
+    else:
+        server_mod.run_health_server(health_app, config)
 
-    # Dummy uvicorn stub
-    class DummyServer:
-        def __init__(self, cfg):
-            self.cfg = cfg
-            self.should_exit = False
+    assert server_mocks.asyncio_run.call_count == run_calls
+    assert _logged(getattr(server_mocks, log), pattern)
 
-        def serve(self):
-            return None
 
-    monkeypatch.setitem(
-        sys.modules,
-        "uvicorn",
-        types.SimpleNamespace(Config=lambda *a, **k: None, Server=DummyServer),
-    )
-    server_mod.Server = None
+@pytest.mark.parametrize("installed", [True, False], ids=["uvloop", "stock"])
+def test_event_loop_factory(monkeypatch, installed):
+    """uvloop's loop constructor is used when importable, otherwise asyncio's default."""
+    fake_uvloop = types.SimpleNamespace(new_event_loop=object())
+    monkeypatch.setitem(sys.modules, "uvloop", fake_uvloop if installed else None)
 
-    # Make new_event_loop raise to hit the health_server_error branch
-    mocker.patch(
-        "external_dns_technitium_webhook.server.asyncio.new_event_loop",
-        side_effect=Exception("loop fail"),
-    )
-    mocker.patch("external_dns_technitium_webhook.server.signal.signal")
-    mock_err = mocker.patch("external_dns_technitium_webhook.server.logging.error")
+    factory = server_mod._event_loop_factory()
 
-    server_mod.run_servers(app, health_app, config)
-
-    assert any(
-        "Health server error" in str(c) or "encountered error during startup" in str(c)
-        for c in mock_err.call_args_list
-    )
+    assert factory is (fake_uvloop.new_event_loop if installed else None)